@@ -0,0 +1,89 @@
+import time
+from pathlib import Path
+
+from confirmation_parser import (
+    EXTERNAL_DATA_DIR,
+    KEEP_ALIVE,
+    MODEL,
+    build_chat_messages,
+    prompt_document,
+)
+from llm_metadata import FIELD_LLM_METADATA
+from ollama_client import OllamaClient
+
+BENCHMARK_DOCUMENTS = 10
+LAYOUTS = ("field_first", "shared_prefix")
+
+
+def _document_texts(text_dir: Path, documents: int) -> list[str]:
+    paths = sorted(text_dir.glob("TX*.txt"))[:documents]
+    return [path.read_text(encoding="utf-8") for path in paths]
+
+
+def _run_layout(client: OllamaClient, texts: list[str], layout: str) -> dict:
+    """Ask every field of every document, one document's fields back to back."""
+    totals = {"calls": 0, "prompt_tokens": 0, "prompt_eval_ns": 0, "total_ns": 0}
+    started = time.perf_counter()
+    for text in texts:
+        for metadata in FIELD_LLM_METADATA.values():
+            response = client.chat(
+                model=MODEL,
+                messages=build_chat_messages(
+                    metadata.system_prompt,
+                    metadata.few_shot,
+                    prompt_document(text, [metadata], layout),
+                    layout,
+                ),
+                format=metadata.format_schema,
+                options={"temperature": 0.0},
+                keep_alive=KEEP_ALIVE,
+            )
+            totals["calls"] += 1
+            # Ollama reports only the tokens it had to evaluate, so cached
+            # prefix tokens lower prompt_eval_count.
+            totals["prompt_tokens"] += response.get("prompt_eval_count") or 0
+            totals["prompt_eval_ns"] += response.get("prompt_eval_duration") or 0
+            totals["total_ns"] += response.get("total_duration") or 0
+    totals["wall_seconds"] = time.perf_counter() - started
+    return totals
+
+
+def benchmark_prompt_layouts(
+    text_dir: Path = EXTERNAL_DATA_DIR,
+    documents: int = BENCHMARK_DOCUMENTS,
+    layouts=LAYOUTS,
+) -> dict[str, dict]:
+    """Compare prompt-eval work of the per-field calls under each prompt layout."""
+    texts = _document_texts(text_dir, documents)
+    if not texts:
+        raise FileNotFoundError(f"No TX*.txt documents in {text_dir}")
+
+    client = OllamaClient()
+    # Load the model first so the first layout does not pay for it.
+    client.chat(model=MODEL, messages=[{"role": "user", "content": "ok"}], keep_alive=KEEP_ALIVE)
+
+    results = {layout: _run_layout(client, texts, layout) for layout in layouts}
+    client.close()
+    print(f"{len(texts)} document(s) x {len(FIELD_LLM_METADATA)} field(s) with {MODEL}")
+    print(f"{'layout':<15}{'prompt tokens':>15}{'prompt eval s':>15}{'total s':>10}{'wall s':>10}")
+    for layout, totals in results.items():
+        print(
+            f"{layout:<15}{totals['prompt_tokens']:>15}"
+            f"{totals['prompt_eval_ns'] / 1e9:>15.2f}"
+            f"{totals['total_ns'] / 1e9:>10.2f}"
+            f"{totals['wall_seconds']:>10.2f}"
+        )
+
+    baseline = results.get("field_first")
+    shared = results.get("shared_prefix")
+    if baseline and shared and baseline["prompt_eval_ns"]:
+        saved = baseline["prompt_eval_ns"] - shared["prompt_eval_ns"]
+        print(
+            f"shared_prefix saves {saved / 1e9:.2f}s of prompt evaluation "
+            f"({saved / baseline['prompt_eval_ns'] * 100:.1f}%)"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_prompt_layouts()
@@ -0,0 +1,197 @@
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+import confirmation_parser
+from create_confirmation_table import create_confirmation_table
+from mock_ollama_server import MockOllamaServer
+from synthetic_corpus import (
+    BENCHMARK_DATA_DIR,
+    SCALES,
+    TEXT_DIR_NAME,
+    WSS_FILE_NAME,
+    generate_corpus,
+)
+from update_validation_status import update_validation_statuses
+from wss_loader import load_wss_data_to_db
+
+BENCHMARK_RESULTS_DIR = Path("benchmark_results")
+BENCHMARK_SCALE = "1k"
+# Seconds the mock Ollama server waits before answering each chat request.
+MOCK_LATENCY_SECONDS = 0.0
+# Mock servers the parser balances over, each answering MOCK_NUM_PARALLEL requests at once.
+MOCK_SERVERS = 1
+MOCK_NUM_PARALLEL: int | None = None
+PARSER_WORKERS = 4
+# Rows sent through confirmation_parser; None processes every row.
+PARSER_ROW_LIMIT: int | None = None
+# Days covered by the narrower dashboard date range.
+DASHBOARD_RECENT_DAYS = 180
+# Stage output (one line per extracted value) would dominate the timings.
+QUIET_STAGES = True
+
+
+@contextlib.contextmanager
+def _stage_output():
+    if not QUIET_STAGES:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _timed(stages: dict, name: str, rows: int, func, *args, **kwargs):
+    print(f"Running {name}...")
+    with _stage_output():
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - started
+    stages[name] = {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+    print(f"  {name}: {seconds:.2f}s")
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _remove_database(db_path: Path) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+
+
+def _time_dashboard_queries(db_path: Path) -> dict:
+    import pandas as pd
+    import streamlit as st
+
+    import streamlit_dashboard as dashboard
+
+    st.cache_data.clear()
+    token = dashboard.db_change_token(db_path)
+    bounds = dashboard.load_date_bounds(db_path, token)
+    ranges = {"all": (None, None)}
+    if bounds is not None:
+        recent_start = (pd.Timestamp(bounds[1]) - pd.Timedelta(days=DASHBOARD_RECENT_DAYS)).date()
+        ranges[f"last_{DASHBOARD_RECENT_DAYS}_days"] = (recent_start, bounds[1])
+
+    timings = {"summary_tables_current": dashboard.summary_tables_current(db_path, token)}
+    for range_name, (start_date, end_date) in ranges.items():
+        queries = {
+            "kpis": lambda: dashboard.load_kpis(db_path, token, start_date, end_date),
+            "field_counts": lambda: dashboard.load_field_counts(db_path, token, start_date, end_date),
+            "match_distribution": lambda: dashboard.load_match_distribution(
+                db_path, token, start_date, end_date
+            ),
+            "transaction_count": lambda: dashboard.load_transaction_count(
+                db_path, token, start_date, end_date, ""
+            ),
+            "transaction_page": lambda: dashboard.load_transaction_page(
+                db_path, token, start_date, end_date, "", dashboard.DEFAULT_PAGE_SIZE, 0
+            ),
+        }
+        for query_name, query in queries.items():
+            started = time.perf_counter()
+            query()
+            timings[f"{range_name}.{query_name}"] = round(time.perf_counter() - started, 4)
+    return timings
+
+
+def run_benchmark(
+    scale: str = BENCHMARK_SCALE,
+    latency_seconds: float = MOCK_LATENCY_SECONDS,
+    servers: int = MOCK_SERVERS,
+    num_parallel: int | None = MOCK_NUM_PARALLEL,
+    workers: int = PARSER_WORKERS,
+    parser_row_limit: int | None = PARSER_ROW_LIMIT,
+    results_dir: Path = BENCHMARK_RESULTS_DIR,
+) -> dict:
+    """Time the pipeline end to end on a synthetic corpus against mock Ollama servers.
+
+    Stages: corpus generation (first run of a scale only), WSS load and
+    unchanged reload, extraction, full validation and the dashboard queries.
+    Results are saved as JSON under ``results_dir`` and returned.
+    """
+    rows = SCALES[scale]
+    data_dir = BENCHMARK_DATA_DIR / scale
+    wss_file = data_dir / WSS_FILE_NAME
+    text_dir = data_dir / TEXT_DIR_NAME
+    db_path = data_dir / "confirmation.db"
+    parser_rows = rows if parser_row_limit is None else min(rows, parser_row_limit)
+    stages: dict = {}
+
+    if not wss_file.exists():
+        _timed(stages, "generate_corpus", rows, generate_corpus, data_dir, rows)
+
+    _remove_database(db_path)
+    with _stage_output():
+        create_confirmation_table(db_path)
+    _timed(stages, "wss_load", rows, load_wss_data_to_db, wss_file, db_path)
+    _timed(stages, "wss_reload_unchanged", rows, load_wss_data_to_db, wss_file, db_path)
+
+    with contextlib.ExitStack() as stack:
+        mocks = [
+            stack.enter_context(
+                MockOllamaServer(latency_seconds=latency_seconds, num_parallel=num_parallel)
+            )
+            for _ in range(max(servers, 1))
+        ]
+        row_ids = None if parser_row_limit is None else range(1, parser_rows + 1)
+        _timed(
+            stages,
+            "confirmation_parser",
+            parser_rows,
+            confirmation_parser.process_new_raw_rows,
+            db_path,
+            workers=workers,
+            use_cache=False,
+            row_ids=row_ids,
+            text_dir=text_dir,
+            hosts=[mock.url for mock in mocks],
+        )
+        llm_requests = [mock.requests for mock in mocks]
+
+    _timed(stages, "validation_full", rows, update_validation_statuses, db_path, full=True)
+    print("Running dashboard queries...")
+    dashboard_timings = _time_dashboard_queries(db_path)
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "rows": rows,
+        "settings": {
+            "mock_latency_seconds": latency_seconds,
+            "mock_servers": len(llm_requests),
+            "mock_num_parallel": num_parallel,
+            "parser_workers": workers,
+            "parser_rows": parser_rows,
+        },
+        "llm_requests": sum(llm_requests),
+        "llm_requests_per_server": llm_requests,
+        "stages": stages,
+        "dashboard_queries_seconds": dashboard_timings,
+    }
+    results_dir.mkdir(parents=True, exist_ok=True)
+    results_path = results_dir / f"{time.strftime('%Y%m%dT%H%M%S')}_{scale}.json"
+    results_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Benchmark results saved to {results_path}")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,14 +1,177 @@
 import json
+import queue
 import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
-import ollama
-
-from llm_metadata import FIELD_LLM_METADATA, FieldLLMMetadata
+from create_confirmation_table import PENDING_LLM_CONDITION, ensure_confirmation_schema
+from document_fingerprint import (
+    DocumentFingerprint,
+    decode_minhash,
+    encode_minhash,
+    fingerprint_document,
+    lsh_band_keys,
+    minhash_similarity,
+    normalize_document,
+)
+from llm_cache import LLMResponseCache, make_cache_key
+from ollama_client import OLLAMA_HOSTS, LLMCallError, OllamaClient
+from text_windows import estimate_tokens, relevant_window
+from update_validation_status import validate_rows
+from llm_metadata import (
+    FIELD_LLM_METADATA,
+    GENERAL_SYSTEM_PROMPT,
+    FieldLLMMetadata,
+    build_combined_few_shot,
+    build_combined_schema,
+    build_combined_system_prompt,
+    value_matches_schema,
+)
 
 MODEL = "llama3.2:latest"
 DB_PATH = Path("DB") / "confirmation.db"
 EXTERNAL_DATA_DIR = Path("External_Data")
+# "combined" extracts all missing fields of a row with one LLM call and re-asks
+# per field only for invalid answers; "per_field" issues one call per field.
+EXTRACTION_MODE = "combined"
+# Number of rows extracted concurrently. Keep at or below the number of requests
+# the Ollama server runs in parallel (OLLAMA_NUM_PARALLEL); 1 keeps the run serial.
+WORKERS = 1
+# Rows submitted to the worker pool but not yet written back, per worker.
+IN_FLIGHT_PER_WORKER = 2
+# Rows read per keyset-paginated work query.
+FETCH_CHUNK_SIZE = 500
+# Buffered results are written in one short transaction every FLUSH_EVERY_ROWS
+# rows or FLUSH_INTERVAL_SECONDS, whichever comes first.
+FLUSH_EVERY_ROWS = 25
+FLUSH_INTERVAL_SECONDS = 10.0
+# Recompute *_validation for flushed rows in the same transaction as their *_LLM values.
+VALIDATE_ON_WRITE = True
+# Reuse stored responses for identical model/prompt/schema/document inputs.
+USE_LLM_CACHE = True
+# Try each field's rule_extractor before calling the LLM.
+USE_RULE_EXTRACTORS = True
+# Send only the lines around each field's anchor labels instead of the full document.
+USE_TEXT_WINDOWS = True
+# "field_first" puts the field-specific system prompt first and the document
+# last. "shared_prefix" sends the general rules and the document first and the
+# field instructions and few-shot last, so every call for one document shares a
+# prompt prefix that Ollama can reuse from its KV cache. The document window
+# then covers the anchors of all fields so it is identical across calls.
+PROMPT_LAYOUT = "field_first"
+# How long Ollama keeps the model (and its prompt cache) loaded after a request.
+KEEP_ALIVE = "10m"
+# Ask each field's cheaper FieldLLMMetadata.models first and escalate to MODEL
+# only when the answer fails validation or disagrees with the rule extractor.
+# Needs the cheaper models pulled; a tier the server does not have is skipped.
+USE_MODEL_TIERS = False
+# Copy *_LLM values from an already extracted document with the same
+# normalized-text fingerprint instead of calling the LLM again.
+USE_DOCUMENT_FINGERPRINTS = True
+# Also match near-duplicates by MinHash similarity; only fields whose anchor
+# windows are identical in both documents are copied.
+USE_NEAR_DUPLICATES = False
+NEAR_DUPLICATE_THRESHOLD = 0.9
+NEAR_DUPLICATE_CANDIDATES = 20
+# Fingerprints of this run's documents kept in memory so a duplicate arriving
+# before its first copy is written waits for that result.
+RECENT_FINGERPRINTS = 10_000
+
+
+# Ollama response metrics stored per call in llm_call_log.
+CALL_METRICS = (
+    "prompt_eval_count",
+    "eval_count",
+    "prompt_eval_duration",
+    "eval_duration",
+    "load_duration",
+    "total_duration",
+)
+
+
+@dataclass
+class _RunContext:
+    """Per-run state shared by the worker threads."""
+
+    cache: LLMResponseCache | None = None
+    client: OllamaClient | None = None
+    stats: Counter = field(default_factory=Counter)
+    # Start time plus a random suffix, so runs started in the same second stay apart.
+    run_id: str = field(
+        default_factory=lambda: f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    )
+    started: float = field(default_factory=time.monotonic)
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    # (field, cheap model, "asked" or "escalated") -> fields.
+    tier_stats: Counter = field(default_factory=Counter)
+    # Tier models the server answered 404 for; skipped for the rest of the run.
+    missing_models: set[str] = field(default_factory=set)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    # Calls of the row the current worker thread is extracting.
+    _row_calls: threading.local = field(default_factory=threading.local)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def count_tier(self, field_name: str, model: str, outcome: str) -> None:
+        with self._lock:
+            self.tier_stats[(field_name, model, outcome)] += 1
+
+    def mark_missing_model(self, model: str) -> None:
+        with self._lock:
+            if model in self.missing_models:
+                return
+            self.missing_models.add(model)
+        print(f"Model {model} is not available on the Ollama server; skipping it as a model tier")
+
+    def record_call(self, field_name: str, model: str, response, wall_seconds: float) -> None:
+        metrics = {name: response.get(name) for name in CALL_METRICS}
+        with self._lock:
+            self.latencies.setdefault(field_name, []).append(wall_seconds)
+            self.stats["prompt_tokens"] += metrics["prompt_eval_count"] or 0
+            self.stats["eval_tokens"] += metrics["eval_count"] or 0
+        self._log_call(
+            {
+                "field": field_name,
+                "model": model,
+                "wall_seconds": wall_seconds,
+                "error": None,
+                **metrics,
+            }
+        )
+
+    def record_error(self, field_name: str, model: str, error: Exception, wall_seconds: float) -> None:
+        with self._lock:
+            self.stats["llm_errors"] += 1
+            self.stats[f"llm_errors:{type(error).__name__}"] += 1
+        self._log_call(
+            {
+                "field": field_name,
+                "model": model,
+                "wall_seconds": wall_seconds,
+                "error": str(error),
+                **{name: None for name in CALL_METRICS},
+            }
+        )
+
+    def _log_call(self, call: dict) -> None:
+        calls = getattr(self._row_calls, "calls", None)
+        if calls is not None:
+            calls.append(call)
+
+    def start_row(self) -> None:
+        self._row_calls.calls = []
+
+    def take_row_calls(self) -> list[dict]:
+        calls = getattr(self._row_calls, "calls", None) or []
+        self._row_calls.calls = None
+        return calls
 
 
 def _has_value(value) -> bool:
@@ -19,43 +182,320 @@ def _has_value(value) -> bool:
     return True
 
 
-def _extract_column_value(raw_value, metadata: FieldLLMMetadata):
+def build_chat_messages(
+    system_prompt: str,
+    few_shot: str,
+    raw_value,
+    layout: str | None = None,
+) -> list[dict]:
+    """Arrange prompt parts for ``layout`` (default PROMPT_LAYOUT)."""
+    layout = PROMPT_LAYOUT if layout is None else layout
+    if layout == "shared_prefix":
+        task_rules = system_prompt.removeprefix(GENERAL_SYSTEM_PROMPT).strip()
+        return [
+            {"role": "system", "content": GENERAL_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Document:\n{raw_value}"},
+            {
+                "role": "user",
+                "content": f"{task_rules}\n\n{few_shot}\n\nReturn ONLY the JSON object.",
+            },
+        ]
+    if layout != "field_first":
+        raise ValueError(f"Unknown prompt layout: {layout}")
+
     user_prompt = (
-        f"{metadata.few_shot}\n\n"
+        f"{few_shot}\n\n"
         f"Input:\n{raw_value}\n\n"
         "Return ONLY the JSON object."
     )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    response = ollama.chat(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": metadata.system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        format=metadata.format_schema,
-        options={"temperature": 0.0},
-    )
-    parsed = json.loads(response["message"]["content"])
+
+def _chat_json(
+    system_prompt: str,
+    few_shot: str,
+    raw_value,
+    format_schema: dict,
+    context: _RunContext | None = None,
+    field_name: str = "combined",
+    model: str = MODEL,
+    layout: str | None = None,
+) -> dict:
+    """Ask ``model`` for a JSON object; ``raw_value`` must be the window built for ``layout``."""
+    layout = PROMPT_LAYOUT if layout is None else layout
+    cache = context.cache if context is not None else None
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key(
+            model, system_prompt, few_shot, format_schema, raw_value, layout
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _parse_json_object(cached)
+
+    client = context.client if context is not None else None
+    started = time.perf_counter()
+    try:
+        response = (client or _default_client()).chat(
+            model=model,
+            messages=build_chat_messages(system_prompt, few_shot, raw_value, layout),
+            format=format_schema,
+            options={"temperature": 0.0},
+            keep_alive=KEEP_ALIVE,
+        )
+        content = response["message"]["content"]
+        try:
+            parsed = _parse_json_object(content)
+        except json.JSONDecodeError as exc:
+            raise LLMCallError(f"Malformed JSON from {model}: {exc}") from exc
+    except LLMCallError as exc:
+        if context is None:
+            raise
+        # Recorded instead of raised: the field stays empty and the next run retries it.
+        context.record_error(field_name, model, exc, time.perf_counter() - started)
+        if exc.status_code == 404 and model != MODEL:
+            context.mark_missing_model(model)
+        return {}
+    wall_seconds = time.perf_counter() - started
+    if context is not None:
+        context.count("llm_calls")
+        context.record_call(field_name, model, response, wall_seconds)
+    if cache is not None:
+        cache.put(cache_key, content)
+    return parsed
+
+
+_DEFAULT_CLIENT: OllamaClient | None = None
+_DEFAULT_CLIENT_LOCK = threading.Lock()
+
+
+def _default_client() -> OllamaClient:
+    """Client for calls made outside process_new_raw_rows."""
+    global _DEFAULT_CLIENT
+    with _DEFAULT_CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None:
+            _DEFAULT_CLIENT = OllamaClient()
+        return _DEFAULT_CLIENT
+
+
+def _parse_json_object(content: str) -> dict:
+    parsed = json.loads(content)
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def prompt_document(
+    raw_value, metadata_list: list[FieldLLMMetadata], layout: str | None = None
+) -> str:
+    """Document text sent for ``metadata_list`` under ``layout`` (default PROMPT_LAYOUT)."""
+    layout = PROMPT_LAYOUT if layout is None else layout
+    text = str(raw_value)
+    if not USE_TEXT_WINDOWS:
+        return text
+    if layout == "shared_prefix":
+        # One window per document, whatever fields are asked for.
+        metadata_list = list(FIELD_LLM_METADATA.values())
+    anchors = tuple(anchor for metadata in metadata_list for anchor in metadata.anchors)
+    return relevant_window(text, anchors)
+
+
+def _prompt_text(
+    raw_value, metadata_list: list[FieldLLMMetadata], context: _RunContext | None, layout: str
+) -> str:
+    text = str(raw_value)
+    window = prompt_document(text, metadata_list, layout)
+    if context is not None:
+        context.count("document_tokens_full", estimate_tokens(text))
+        context.count("document_tokens_sent", estimate_tokens(window))
+    return window
+
+
+def _model_tiers(metadata: FieldLLMMetadata, context: _RunContext | None = None) -> tuple[str, ...]:
+    """Models to ask for ``metadata``, cheapest first; MODEL is always the last tier."""
+    if not USE_MODEL_TIERS:
+        return (MODEL,)
+    missing = context.missing_models if context is not None else set()
+    return tuple(dict.fromkeys((*(model for model in metadata.models if model not in missing), MODEL)))
+
+
+def _rule_value(raw_value, metadata: FieldLLMMetadata):
+    if metadata.rule_extractor is None:
+        return None
+    return metadata.rule_extractor(str(raw_value))
+
+
+def _same_value(left, right) -> bool:
+    if isinstance(left, str) and isinstance(right, str):
+        return left.strip().upper() == right.strip().upper()
+    return left == right
+
+
+def _needs_escalation(
+    metadata: FieldLLMMetadata, parsed: dict, rule_value, checks: bool = True
+) -> bool:
+    """True when an answer is missing, fails validation or contradicts the rule extractor.
+
+    With ``checks`` off only a missing or off-schema answer counts; the
+    value_validator and the rule extractor are not consulted.
+    """
+    if metadata.output_key not in parsed:
+        return True
+    value = parsed[metadata.output_key]
+    if not value_matches_schema(metadata, value, validate=checks):
+        return True
+    if not checks or rule_value is None or value is None:
+        return False
+    return not _same_value(value, rule_value)
+
+
+def _extract_column_value(
+    raw_value,
+    metadata: FieldLLMMetadata,
+    context: _RunContext | None = None,
+    models: tuple[str, ...] | None = None,
+):
+    """Ask ``models`` (default: the field's tiers) in turn until an answer passes the checks.
+
+    The last model's answer is returned as is.
+    """
+    # Escalations are counted here only when this call starts at the cheap tier.
+    count_tiers = models is None and context is not None
+    models = _model_tiers(metadata, context) if models is None else models
+    count_tiers = count_tiers and len(models) > 1
+    if count_tiers:
+        context.count_tier(metadata.output_key, models[0], "asked")
+    rule_value = _rule_value(raw_value, metadata) if len(models) > 1 else None
+    # Read once so the window, the messages and the cache key agree.
+    layout = PROMPT_LAYOUT
+    parsed: dict = {}
+    for tier, model in enumerate(models):
+        if tier == 1 and count_tiers:
+            context.count_tier(metadata.output_key, models[0], "escalated")
+        parsed = _chat_json(
+            metadata.system_prompt,
+            metadata.few_shot,
+            _prompt_text(raw_value, [metadata], context, layout),
+            metadata.format_schema,
+            context,
+            metadata.output_key,
+            model,
+            layout,
+        )
+        if tier == len(models) - 1 or not _needs_escalation(metadata, parsed, rule_value):
+            break
     return parsed.get(metadata.output_key)
 
 
-def _fetch_rows(conn: sqlite3.Connection):
+def _combined_model(metadata_list: list[FieldLLMMetadata], context: _RunContext | None = None) -> str:
+    """First tier shared by every field, or MODEL when they differ."""
+    first_tiers = {_model_tiers(metadata, context)[0] for metadata in metadata_list}
+    return first_tiers.pop() if len(first_tiers) == 1 else MODEL
+
+
+def _extract_row_values(
+    raw_value,
+    metadata_list: list[FieldLLMMetadata],
+    context: _RunContext | None = None,
+) -> dict:
+    """Extract several fields with one merged LLM call.
+
+    Fields missing from the combined answer or violating their schema are
+    re-extracted with the regular single-field prompt. While a field has
+    tiers after the combined call's model, an answer failing its
+    value_validator or contradicting its rule extractor is re-extracted too,
+    starting at the next tier.
+    """
+    if len(metadata_list) == 1:
+        metadata = metadata_list[0]
+        return {metadata.llm_column: _extract_column_value(raw_value, metadata, context)}
+
+    model = _combined_model(metadata_list, context)
+    # Fields whose combined call is their cheap tier, for the escalation rates.
+    cheap_keys = set()
+    if context is not None and model != MODEL:
+        cheap_keys = {metadata.output_key for metadata in metadata_list}
+        for key in cheap_keys:
+            context.count_tier(key, model, "asked")
+    layout = PROMPT_LAYOUT
+    parsed = _chat_json(
+        build_combined_system_prompt(metadata_list),
+        build_combined_few_shot(metadata_list),
+        _prompt_text(raw_value, metadata_list, context, layout),
+        build_combined_schema(metadata_list),
+        context,
+        model=model,
+        layout=layout,
+    )
+
+    values = {}
+    for metadata in metadata_list:
+        value = parsed.get(metadata.output_key)
+        tiers = _model_tiers(metadata, context)
+        remaining = tiers[tiers.index(model) + 1:] if model in tiers else tiers
+        # Asking the model that already answered again only helps when the
+        # answer is missing or off-schema, not when it fails the value checks.
+        rule_value = _rule_value(raw_value, metadata) if remaining else None
+        if _needs_escalation(metadata, parsed, rule_value, checks=bool(remaining)):
+            if metadata.output_key in cheap_keys:
+                context.count_tier(metadata.output_key, model, "escalated")
+            value = _extract_column_value(raw_value, metadata, context, remaining or (MODEL,))
+        values[metadata.llm_column] = value
+    return values
+
+
+_ROW_SELECT = """
+    SELECT
+        id,
+        currency, currency_LLM,
+        settlement_amount, settlement_amount_LLM,
+        buy_sell, buy_sell_LLM,
+        isin, isin_LLM,
+        settlement_date, settlement_date_LLM,
+        SSI, SSI_LLM
+    FROM confirmation_data
+"""
+
+
+def _fetch_rows(conn: sqlite3.Connection, chunk_size: int = FETCH_CHUNK_SIZE, row_ids=None):
+    """Yield rows with at least one missing *_LLM value, reading them in id-ordered chunks.
+
+    ``row_ids`` restricts the scan to the given ids.
+    """
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT
-            id,
-            currency, currency_LLM,
-            settlement_amount, settlement_amount_LLM,
-            buy_sell, buy_sell_LLM,
-            isin, isin_LLM,
-            settlement_date, settlement_date_LLM,
-            SSI, SSI_LLM
-        FROM confirmation_data
-        """
-    )
-    return cursor.fetchall()
+    if row_ids is not None:
+        ids = sorted(set(row_ids))
+        for start in range(0, len(ids), chunk_size):
+            batch = ids[start:start + chunk_size]
+            cursor.execute(
+                f"""
+                {_ROW_SELECT}
+                WHERE ({PENDING_LLM_CONDITION}) AND id IN ({", ".join("?" for _ in batch)})
+                ORDER BY id
+                """,
+                batch,
+            )
+            yield from cursor.fetchall()
+        return
+
+    last_id = 0
+    while True:
+        cursor.execute(
+            f"""
+            {_ROW_SELECT}
+            WHERE ({PENDING_LLM_CONDITION}) AND id > ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (last_id, chunk_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1]["id"]
 
 
 def _load_transaction_text(row_id: int, base_dir: Path = EXTERNAL_DATA_DIR) -> str | None:
@@ -65,52 +505,575 @@ def _load_transaction_text(row_id: int, base_dir: Path = EXTERNAL_DATA_DIR) -> s
     return file_path.read_text(encoding="utf-8")
 
 
-def _update_llm_column(conn: sqlite3.Connection, row_id: int, llm_column: str, value) -> None:
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE confirmation_data SET {llm_column} = ? WHERE id = ?",
-        (value, row_id),
+_LLM_COLUMNS_SQL = ", ".join(metadata.llm_column for metadata in FIELD_LLM_METADATA.values())
+
+
+def _store_fingerprints(
+    conn: sqlite3.Connection,
+    documents: list[tuple[int, DocumentFingerprint]],
+) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO document_fingerprints (row_id, fingerprint, minhash) "
+        "VALUES (?, ?, ?)",
+        [
+            (
+                row_id,
+                document.fingerprint,
+                encode_minhash(document.minhash) if document.minhash else None,
+            )
+            for row_id, document in documents
+        ],
+    )
+    conn.executemany(
+        "DELETE FROM document_minhash_bands WHERE row_id = ?",
+        [(row_id,) for row_id, _ in documents],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO document_minhash_bands (band_key, row_id) VALUES (?, ?)",
+        [
+            (band_key, row_id)
+            for row_id, document in documents
+            if document.minhash
+            for band_key in lsh_band_keys(document.minhash)
+        ],
     )
 
 
-def process_new_raw_rows(db_path: Path = DB_PATH) -> int:
+def _backfill_fingerprints(db_path: Path, text_dir: Path) -> None:
+    """Fingerprint extracted rows that have none yet, so later copies can reuse their values."""
     conn = sqlite3.connect(db_path)
-    updated_values = 0
-
     try:
-        rows = _fetch_rows(conn)
-        for row in rows:
-            row_id = row["id"]
-            transaction_text = _load_transaction_text(row_id)
-            if not _has_value(transaction_text):
-                print(
-                    f"Row {row_id}: skipped (missing or empty "
-                    f"External_Data/TX{row_id:06d}.txt)"
-                )
-                continue
+        ensure_confirmation_schema(conn)
+        row_ids = [
+            row_id
+            for (row_id,) in conn.execute(
+                f"""
+                SELECT id FROM confirmation_data AS c
+                WHERE NOT ({PENDING_LLM_CONDITION})
+                AND NOT EXISTS (SELECT 1 FROM document_fingerprints AS f WHERE f.row_id = c.id)
+                """
+            )
+        ]
+        stored = 0
+        for start in range(0, len(row_ids), FETCH_CHUNK_SIZE):
+            documents = []
+            for row_id in row_ids[start:start + FETCH_CHUNK_SIZE]:
+                text = _load_transaction_text(row_id, text_dir)
+                if _has_value(text):
+                    documents.append((row_id, fingerprint_document(text, USE_NEAR_DUPLICATES)))
+            with conn:
+                _store_fingerprints(conn, documents)
+            stored += len(documents)
+    finally:
+        conn.close()
+    if stored:
+        print(f"Fingerprinted {stored} previously extracted document(s)")
 
-            for metadata in FIELD_LLM_METADATA.values():
-                llm_value = row[metadata.llm_column]
 
-                # Process only missing LLM outputs using the transaction text file as input.
-                if _has_value(llm_value):
-                    continue
+def _field_window(text: str, metadata: FieldLLMMetadata) -> str:
+    return normalize_document(relevant_window(text, metadata.anchors))
+
+
+def _twin_values(
+    conn: sqlite3.Connection,
+    row_id: int,
+    document: DocumentFingerprint,
+    transaction_text: str,
+    missing: list[FieldLLMMetadata],
+    text_dir: Path,
+) -> dict:
+    """*_LLM values for ``missing`` taken from a fully extracted copy of the document."""
+    twin = conn.execute(
+        f"""
+        SELECT {_LLM_COLUMNS_SQL}
+        FROM document_fingerprints AS f
+        JOIN confirmation_data AS c ON c.id = f.row_id
+        WHERE f.fingerprint = ? AND f.row_id != ? AND NOT ({PENDING_LLM_CONDITION})
+        LIMIT 1
+        """,
+        (document.fingerprint, row_id),
+    ).fetchone()
+    if twin is not None:
+        return {metadata.llm_column: twin[metadata.llm_column] for metadata in missing}
+    if document.minhash is None:
+        return {}
+
+    band_keys = lsh_band_keys(document.minhash)
+    candidates = conn.execute(
+        f"""
+        SELECT c.id, f.minhash, {_LLM_COLUMNS_SQL}
+        FROM confirmation_data AS c
+        JOIN document_fingerprints AS f ON f.row_id = c.id
+        WHERE c.id IN (
+            SELECT row_id FROM document_minhash_bands
+            WHERE band_key IN ({", ".join("?" for _ in band_keys)}) AND row_id != ?
+        )
+        AND f.minhash IS NOT NULL AND NOT ({PENDING_LLM_CONDITION})
+        LIMIT ?
+        """,
+        [*band_keys, row_id, NEAR_DUPLICATE_CANDIDATES],
+    ).fetchall()
+    scored = [
+        (minhash_similarity(document.minhash, decode_minhash(candidate["minhash"])), candidate)
+        for candidate in candidates
+    ]
+    similarity, best = max(scored, key=lambda item: item[0], default=(0.0, None))
+    if best is None or similarity < NEAR_DUPLICATE_THRESHOLD:
+        return {}
+    twin_text = _load_transaction_text(best["id"], text_dir)
+    if not _has_value(twin_text):
+        return {}
+    return {
+        metadata.llm_column: best[metadata.llm_column]
+        for metadata in missing
+        if _field_window(transaction_text, metadata) == _field_window(twin_text, metadata)
+    }
+
+
+def _update_llm_columns(conn: sqlite3.Connection, updates: list[tuple[int, str, object]]) -> None:
+    """Apply (row_id, llm_column, value) updates with one executemany per column."""
+    by_column: dict[str, list[tuple[object, int]]] = {}
+    for row_id, llm_column, value in updates:
+        by_column.setdefault(llm_column, []).append((value, row_id))
+
+    cursor = conn.cursor()
+    for llm_column, params in by_column.items():
+        cursor.executemany(
+            f"UPDATE confirmation_data SET {llm_column} = ? WHERE id = ?",
+            params,
+        )
+
+
+def _extract_rule_values(transaction_text: str, missing: list[FieldLLMMetadata]) -> dict:
+    values = {}
+    for metadata in missing:
+        if metadata.rule_extractor is None:
+            continue
+        value = metadata.rule_extractor(transaction_text)
+        if value is not None and value_matches_schema(metadata, value):
+            values[metadata.llm_column] = value
+    return values
+
+
+def _extract_missing_values(
+    transaction_text: str,
+    missing: list[FieldLLMMetadata],
+    context: _RunContext,
+) -> dict:
+    values = _extract_rule_values(transaction_text, missing) if USE_RULE_EXTRACTORS else {}
+    context.count("resolved_by_rules", len(values))
+
+    llm_fields = [metadata for metadata in missing if metadata.llm_column not in values]
+    if not llm_fields:
+        return values
+
+    if EXTRACTION_MODE == "combined":
+        llm_values = _extract_row_values(transaction_text, llm_fields, context)
+    else:
+        llm_values = {
+            metadata.llm_column: _extract_column_value(transaction_text, metadata, context)
+            for metadata in llm_fields
+        }
+    resolved = sum(1 for value in llm_values.values() if value is not None)
+    context.count("resolved_by_llm", resolved)
+    context.count("unresolved", len(llm_values) - resolved)
+    values.update(llm_values)
+    return values
+
+
+def _print_run_summary(context: _RunContext) -> None:
+    print(
+        f"Fields resolved: {context.stats['resolved_by_rules']} by rules, "
+        f"{context.stats['resolved_by_llm']} by LLM, "
+        f"{context.stats['copied_from_duplicates']} copied from duplicate documents, "
+        f"{context.stats['unresolved']} unresolved"
+    )
+    print(f"LLM calls: {context.stats['llm_calls']}")
+    retries = context.client.retries if context.client is not None else 0
+    if context.stats["llm_errors"] or retries:
+        error_types = ", ".join(
+            f"{name.split(':', 1)[1]} {count}"
+            for name, count in sorted(context.stats.items())
+            if name.startswith("llm_errors:")
+        )
+        print(
+            f"LLM errors: {context.stats['llm_errors']} failed call(s) [{error_types}], "
+            f"{retries} retried attempt(s), circuit opened {context.client.circuit_opened} time(s). "
+            "Fields left empty are retried on the next run."
+        )
+    full_tokens = context.stats["document_tokens_full"]
+    sent_tokens = context.stats["document_tokens_sent"]
+    if full_tokens:
+        print(
+            f"Document tokens sent: ~{sent_tokens} of ~{full_tokens} "
+            f"({(full_tokens - sent_tokens) / full_tokens * 100:.1f}% saved by text windows)"
+        )
+    if context.cache is not None:
+        print(f"LLM cache: {context.cache.hits} hit(s), {context.cache.misses} miss(es)")
+
+    elapsed = time.monotonic() - context.started
+    documents = context.stats["documents"]
+    if documents and elapsed > 0:
+        print(f"Throughput: {documents} document(s) in {elapsed:.1f}s ({documents / elapsed:.2f} docs/s)")
+    llm_documents = context.stats["llm_documents"]
+    if llm_documents:
+        prompt_tokens = context.stats["prompt_tokens"]
+        eval_tokens = context.stats["eval_tokens"]
+        print(
+            f"Tokens per document sent to the LLM: {prompt_tokens / llm_documents:.0f} prompt, "
+            f"{eval_tokens / llm_documents:.0f} generated"
+        )
+    for (field_name, model, outcome), asked in sorted(context.tier_stats.items()):
+        if outcome != "asked":
+            continue
+        escalated = context.tier_stats[(field_name, model, "escalated")]
+        print(
+            f"Escalations {field_name}: {escalated} of {asked} field(s) asked of {model} "
+            f"({escalated / asked * 100:.1f}%)"
+        )
+    for field_name, latencies in sorted(context.latencies.items()):
+        latencies = sorted(latencies)
+        print(
+            f"Latency {field_name}: {len(latencies)} call(s), "
+            f"p50 {_percentile(latencies, 50):.2f}s, "
+            f"p95 {_percentile(latencies, 95):.2f}s, "
+            f"p99 {_percentile(latencies, 99):.2f}s"
+        )
+    if context.client is not None and len(context.client.hosts) > 1:
+        for host in context.client.host_stats():
+            latency = f"{host['latency_seconds']:.2f}s" if host["latency_seconds"] is not None else "n/a"
+            print(
+                f"Host {host['host']}: {host['requests']} request(s), {host['failures']} failure(s), "
+                f"recent latency {latency}{'' if host['available'] else ', drained'}"
+            )
+    if context.latencies:
+        print(f"Per-call metrics saved to llm_call_log (run_id {context.run_id})")
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(int(-(-pct * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+def _insert_call_log(conn: sqlite3.Connection, run_id: str, calls: list[tuple[int, dict]]) -> None:
+    conn.executemany(
+        f"""
+        INSERT INTO llm_call_log
+            (run_id, row_id, field, model, {", ".join(CALL_METRICS)}, wall_seconds, error)
+        VALUES (?, ?, ?, ?, {", ".join("?" for _ in CALL_METRICS)}, ?, ?)
+        """,
+        [
+            (
+                run_id,
+                row_id,
+                call["field"],
+                call["model"],
+                *(call[name] for name in CALL_METRICS),
+                call["wall_seconds"],
+                call["error"],
+            )
+            for row_id, call in calls
+        ],
+    )
+
+
+class _ResultWriter(threading.Thread):
+    """Single thread owning the sqlite3 connection that writes extraction results.
+
+    Worker threads only call the LLM and hand their results over through a
+    queue, so SQLite never sees concurrent writers. Results are buffered and
+    committed in short WAL transactions, so an interrupted run keeps every
+    flushed row and the next run resumes with the rows still missing values.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        db_path: Path,
+        run_id: str,
+        flush_every_rows: int = FLUSH_EVERY_ROWS,
+        flush_interval_seconds: float = FLUSH_INTERVAL_SECONDS,
+    ):
+        super().__init__(name="confirmation-result-writer", daemon=True)
+        self.db_path = db_path
+        self.run_id = run_id
+        self.flush_every_rows = flush_every_rows
+        self.flush_interval_seconds = flush_interval_seconds
+        self.updated_values = 0
+        self.error: BaseException | None = None
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: list[
+            tuple[int, list[FieldLLMMetadata], dict, list[dict], DocumentFingerprint | None]
+        ] = []
+
+    def submit(
+        self,
+        row_id: int,
+        missing: list[FieldLLMMetadata],
+        values: dict,
+        calls: list[dict] | None = None,
+        document: DocumentFingerprint | None = None,
+    ) -> None:
+        self._queue.put((row_id, missing, values, calls or [], document))
 
-                parsed_value = _extract_column_value(transaction_text, metadata)
-                _update_llm_column(conn, row_id, metadata.llm_column, parsed_value)
-                updated_values += 1
+    def close(self) -> int:
+        """Flush remaining results and stop the writer."""
+        self._queue.put(self._STOP)
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.updated_values
 
+    def run(self) -> None:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            ensure_confirmation_schema(conn)
+            conn.commit()
+            last_flush = time.monotonic()
+            while True:
+                timeout = max(self.flush_interval_seconds - (time.monotonic() - last_flush), 0.0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is self._STOP:
+                    break
+                if item is not None:
+                    self._pending.append(item)
+
+                if (
+                    len(self._pending) >= self.flush_every_rows
+                    or time.monotonic() - last_flush >= self.flush_interval_seconds
+                ):
+                    self._flush(conn)
+                    last_flush = time.monotonic()
+            self._flush(conn)
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        if not self._pending:
+            return
+
+        updates = [
+            (row_id, metadata.llm_column, values[metadata.llm_column])
+            for row_id, missing, values, _, _ in self._pending
+            for metadata in missing
+        ]
+        calls = [(row_id, call) for row_id, _, _, row_calls, _ in self._pending for call in row_calls]
+        documents = [
+            (row_id, document) for row_id, _, _, _, document in self._pending if document is not None
+        ]
+        with conn:
+            _update_llm_columns(conn, updates)
+            if calls:
+                _insert_call_log(conn, self.run_id, calls)
+            if documents:
+                _store_fingerprints(conn, documents)
+            if VALIDATE_ON_WRITE:
+                validate_rows(conn, [row_id for row_id, _, _, _, _ in self._pending])
+
+        for row_id, missing, values, _, _ in self._pending:
+            for metadata in missing:
                 print(
                     f"Row {row_id}: {metadata.source_column} -> "
-                    f"{metadata.llm_column} = {parsed_value}"
+                    f"{metadata.llm_column} = {values[metadata.llm_column]}"
                 )
+        self.updated_values += len(updates)
+        self._pending.clear()
 
-        conn.commit()
-        return updated_values
+
+def reset_llm_values(db_path: Path, row_ids) -> None:
+    """Clear *_LLM values of rows whose transaction text changed so they are extracted again."""
+    row_ids = list(row_ids)
+    assignments = ", ".join(f"{metadata.llm_column} = NULL" for metadata in FIELD_LLM_METADATA.values())
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for start in range(0, len(row_ids), FETCH_CHUNK_SIZE):
+                batch = row_ids[start:start + FETCH_CHUNK_SIZE]
+                conn.execute(
+                    f"UPDATE confirmation_data SET {assignments} "
+                    f"WHERE id IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
     finally:
         conn.close()
 
 
+def process_new_raw_rows(
+    db_path: Path = DB_PATH,
+    workers: int = WORKERS,
+    use_cache: bool = USE_LLM_CACHE,
+    row_ids=None,
+    text_dir: Path = EXTERNAL_DATA_DIR,
+    hosts=OLLAMA_HOSTS,
+) -> int:
+    if USE_DOCUMENT_FINGERPRINTS and row_ids is None:
+        _backfill_fingerprints(db_path, text_dir)
+    conn = sqlite3.connect(db_path)
+    # The fingerprint lookup reads tables the writer thread would otherwise create.
+    ensure_confirmation_schema(conn)
+    conn.commit()
+    context = _RunContext(
+        cache=LLMResponseCache() if use_cache else None,
+        client=OllamaClient(hosts, max_connections=max(workers, 1)),
+    )
+    try:
+        return _process_rows(
+            db_path, _fetch_rows(conn, row_ids=row_ids), workers, context, text_dir
+        )
+    finally:
+        _save_tier_stats(conn, context)
+        conn.close()
+        if context.cache is not None:
+            context.cache.close()
+        context.client.close()
+        _print_run_summary(context)
+
+
+def _save_tier_stats(conn: sqlite3.Connection, context: _RunContext) -> None:
+    rows = [
+        (context.run_id, field_name, model, asked, context.tier_stats[(field_name, model, "escalated")])
+        for (field_name, model, outcome), asked in sorted(context.tier_stats.items())
+        if outcome == "asked"
+    ]
+    if rows:
+        with conn:
+            conn.executemany(
+                "INSERT INTO llm_tier_stats (run_id, field, model, asked, escalated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def _process_rows(
+    db_path: Path,
+    rows,
+    workers: int,
+    context: _RunContext,
+    text_dir: Path = EXTERNAL_DATA_DIR,
+) -> int:
+    writer = _ResultWriter(db_path, context.run_id)
+    writer.start()
+    in_flight = threading.BoundedSemaphore(max(workers, 1) * IN_FLIGHT_PER_WORKER)
+    failures: list[BaseException] = []
+    lookup_conn = sqlite3.connect(db_path) if USE_DOCUMENT_FINGERPRINTS else None
+    if lookup_conn is not None:
+        lookup_conn.row_factory = sqlite3.Row
+    # Fingerprint -> future of the full *_LLM values of this run's first copy.
+    recent: OrderedDict[str, Future] = OrderedDict()
+
+    def _extract_and_submit(
+        row_id: int,
+        transaction_text: str,
+        missing: list[FieldLLMMetadata],
+        known: dict,
+        document: DocumentFingerprint | None,
+        leader: Future | None,
+        copied: dict,
+    ) -> dict | None:
+        try:
+            context.start_row()
+            if leader is not None:
+                leader_values = leader.result()
+                if leader_values is not None:
+                    copied = {
+                        metadata.llm_column: leader_values[metadata.llm_column]
+                        for metadata in missing
+                        if _has_value(leader_values.get(metadata.llm_column))
+                    }
+            remaining = [metadata for metadata in missing if metadata.llm_column not in copied]
+            values = {**copied, **_extract_missing_values(transaction_text, remaining, context)}
+            calls = context.take_row_calls()
+            context.count("documents")
+            context.count("copied_from_duplicates", len(copied))
+            if calls:
+                context.count("llm_documents")
+            writer.submit(row_id, missing, values, calls, document)
+            return {**known, **values}
+        except BaseException as exc:
+            failures.append(exc)
+            return None
+        finally:
+            in_flight.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            for row in rows:
+                if failures or writer.error is not None:
+                    break
+
+                row_id = row["id"]
+                transaction_text = _load_transaction_text(row_id, text_dir)
+                if not _has_value(transaction_text):
+                    print(
+                        f"Row {row_id}: skipped (missing or empty "
+                        f"{text_dir / f'TX{row_id:06d}.txt'})"
+                    )
+                    continue
+
+                # Process only missing LLM outputs using the transaction text file as input.
+                missing = [
+                    metadata
+                    for metadata in FIELD_LLM_METADATA.values()
+                    if not _has_value(row[metadata.llm_column])
+                ]
+                if not missing:
+                    continue
+
+                document = None
+                leader = None
+                copied: dict = {}
+                if lookup_conn is not None:
+                    document = fingerprint_document(transaction_text, USE_NEAR_DUPLICATES)
+                    leader = recent.get(document.fingerprint)
+                    if leader is None:
+                        copied = _twin_values(
+                            lookup_conn, row_id, document, transaction_text, missing, text_dir
+                        )
+                missing_columns = {metadata.llm_column for metadata in missing}
+                known = {
+                    metadata.llm_column: row[metadata.llm_column]
+                    for metadata in FIELD_LLM_METADATA.values()
+                    if metadata.llm_column not in missing_columns
+                }
+
+                in_flight.acquire()
+                future = pool.submit(
+                    _extract_and_submit,
+                    row_id,
+                    transaction_text,
+                    missing,
+                    known,
+                    document,
+                    leader,
+                    copied,
+                )
+                if document is not None and leader is None:
+                    recent[document.fingerprint] = future
+                    if len(recent) > RECENT_FINGERPRINTS:
+                        recent.popitem(last=False)
+    except BaseException:
+        # Keep the results that already finished before re-raising.
+        writer.close()
+        raise
+    finally:
+        if lookup_conn is not None:
+            lookup_conn.close()
+
+    updated_values = writer.close()
+    if failures:
+        raise failures[0]
+    return updated_values
+
+
 if __name__ == "__main__":
     count = process_new_raw_rows()
     print(f"Completed. Updated {count} LLM column value(s).")
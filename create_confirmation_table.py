@@ -1,6 +1,181 @@
 ﻿import sqlite3
 from pathlib import Path
 
+from match_stats import STALE_DAYS_TABLE, create_match_stats_tables, refresh_daily_match_stats
+
+SOURCE_COLUMNS = [
+    "currency",
+    "settlement_amount",
+    "buy_sell",
+    "isin",
+    "settlement_date",
+    "SSI",
+]
+LLM_COLUMNS = [
+    "currency_LLM",
+    "settlement_amount_LLM",
+    "buy_sell_LLM",
+    "isin_LLM",
+    "settlement_date_LLM",
+    "SSI_LLM",
+]
+# Rows the parser still has to work on. Queries must repeat this expression
+# verbatim for SQLite to use the matching partial index.
+PENDING_LLM_CONDITION = " OR ".join(
+    f"{col} IS NULL OR trim({col}) = ''" for col in LLM_COLUMNS
+)
+
+
+def ensure_confirmation_schema(conn: sqlite3.Connection) -> None:
+    """Add the columns, indexes and triggers that older databases may lack."""
+    cursor = conn.cursor()
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(confirmation_data)")}
+    if "validation_pending" not in existing_columns:
+        cursor.execute(
+            "ALTER TABLE confirmation_data "
+            "ADD COLUMN validation_pending INTEGER NOT NULL DEFAULT 1"
+        )
+    if "source_key" not in existing_columns:
+        cursor.execute("ALTER TABLE confirmation_data ADD COLUMN source_key TEXT")
+
+    cursor.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_confirmation_data_pending_llm
+        ON confirmation_data(id)
+        WHERE {PENDING_LLM_CONDITION}
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_confirmation_data_creation_date "
+        "ON confirmation_data(creation_date)"
+    )
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_confirmation_data_source_key
+        ON confirmation_data(source_key)
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_confirmation_data_validation_pending
+        ON confirmation_data(id)
+        WHERE validation_pending = 1
+        """
+    )
+
+    # Summary tables first: the creation_date trigger below writes to them.
+    stats_created = create_match_stats_tables(conn)
+
+    # Re-queue a row for validation whenever a compared value or its day
+    # actually changes. Recreated so older databases pick up new columns.
+    watched_columns = ["creation_date", *SOURCE_COLUMNS, *LLM_COLUMNS]
+    changed_condition = " OR ".join(f"OLD.{col} IS NOT NEW.{col}" for col in watched_columns)
+    cursor.execute("DROP TRIGGER IF EXISTS trg_confirmation_data_validation_pending")
+    cursor.execute(
+        f"""
+        CREATE TRIGGER trg_confirmation_data_validation_pending
+        AFTER UPDATE OF {", ".join(watched_columns)} ON confirmation_data
+        WHEN NEW.validation_pending = 0 AND ({changed_condition})
+        BEGIN
+            UPDATE confirmation_data SET validation_pending = 1 WHERE id = NEW.id;
+        END
+        """
+    )
+    # A row moving to another day leaves its old day's summary counting it;
+    # validate_rows recomputes the days recorded here (same buckets as DAY_SQL).
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_confirmation_data_stale_day
+        AFTER UPDATE OF creation_date ON confirmation_data
+        WHEN coalesce(substr(OLD.creation_date, 1, 10), '')
+            IS NOT coalesce(substr(NEW.creation_date, 1, 10), '')
+        BEGIN
+            INSERT OR IGNORE INTO {STALE_DAYS_TABLE} (day)
+            VALUES (coalesce(substr(OLD.creation_date, 1, 10), ''));
+        END
+        """
+    )
+
+    # One row per LLM request made by confirmation_parser; durations are in
+    # nanoseconds as reported by Ollama, wall_seconds is measured client-side.
+    # Failed requests have no metrics and carry the error instead.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_call_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            row_id INTEGER,
+            field TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_eval_count INTEGER,
+            eval_count INTEGER,
+            prompt_eval_duration INTEGER,
+            eval_duration INTEGER,
+            load_duration INTEGER,
+            total_duration INTEGER,
+            wall_seconds REAL NOT NULL,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    call_log_columns = {row[1] for row in cursor.execute("PRAGMA table_info(llm_call_log)")}
+    if "error" not in call_log_columns:
+        cursor.execute("ALTER TABLE llm_call_log ADD COLUMN error TEXT")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_llm_call_log_run_id ON llm_call_log(run_id)"
+    )
+
+    # Per run and field: fields whose first call went to a cheaper model tier,
+    # and how many of them had to be escalated beyond it.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_tier_stats (
+            run_id TEXT NOT NULL,
+            field TEXT NOT NULL,
+            model TEXT NOT NULL,
+            asked INTEGER NOT NULL,
+            escalated INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, field, model)
+        )
+        """
+    )
+
+    # Normalized-text fingerprints of extracted documents, used to copy *_LLM
+    # values from an identical (or near-identical) document instead of
+    # calling the LLM again.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS document_fingerprints (
+            row_id INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            minhash TEXT
+        )
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_document_fingerprints_fingerprint "
+        "ON document_fingerprints(fingerprint)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS document_minhash_bands (
+            band_key TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (band_key, row_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_document_minhash_bands_row_id "
+        "ON document_minhash_bands(row_id)"
+    )
+
+    # Per-day summaries for the dashboard; validate_rows keeps them current.
+    if stats_created:
+        refresh_daily_match_stats(conn)
+
 
 def create_confirmation_table(db_path: Path = Path("DB") / "confirmation.db") -> None:
     """Create the confirmation table with source and LLM columns."""
@@ -31,10 +206,13 @@ def create_confirmation_table(db_path: Path = Path("DB") / "confirmation.db") ->
             SSI TEXT,
             SSI_LLM TEXT,
             SSI_validation TEXT,
-            creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            validation_pending INTEGER NOT NULL DEFAULT 1,
+            source_key TEXT
         )
         """
     )
+    ensure_confirmation_schema(conn)
 
     conn.commit()
     conn.close()
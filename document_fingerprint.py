@@ -0,0 +1,119 @@
+import hashlib
+import random
+import re
+from dataclasses import dataclass
+
+# Labels whose lines (and value lines) differ between resends of the same
+# confirmation, e.g. the issue date or a per-message reference.
+VOLATILE_LABELS = (
+    "Date",
+    "Confirmation Ref",
+    "Confirmation Date",
+    "Message Ref",
+    "Sent",
+    "Printed",
+    "Time of Last Execution",
+)
+# Lines that only mark a copy of the document.
+VOLATILE_LINES = ("original", "duplicate", "copy", "amended", "amendment", "resend")
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+# LSH bands; rows per band is MINHASH_PERMUTATIONS // MINHASH_BANDS.
+MINHASH_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(seed: int = 0) -> list[tuple[int, int]]:
+    """Fixed (a, b) pairs of the universal hashes a * x + b, so signatures are stable across runs."""
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+        for _ in range(MINHASH_PERMUTATIONS)
+    ]
+
+
+_PERMUTATIONS = _permutations()
+_WHITESPACE = re.compile(r"\s+")
+_VOLATILE_LABEL = re.compile(
+    r"^(?:" + "|".join(re.escape(label) for label in VOLATILE_LABELS) + r")\s*:\s*(.*)$",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class DocumentFingerprint:
+    fingerprint: str
+    # MinHash signature for near-duplicate lookup; None when not computed.
+    minhash: tuple[int, ...] | None = None
+
+
+def normalize_document(text: str) -> str:
+    """Lowercase, collapse whitespace and drop volatile header lines."""
+    lines = [_WHITESPACE.sub(" ", line).strip().lower() for line in text.splitlines()]
+    kept = []
+    skip_value_line = False
+    for line in lines:
+        if not line:
+            continue
+        if skip_value_line:
+            skip_value_line = False
+            continue
+        match = _VOLATILE_LABEL.match(line)
+        if match:
+            # "Date:" on its own line is followed by its value line.
+            skip_value_line = not match.group(1)
+            continue
+        if line in VOLATILE_LINES:
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def minhash_signature(normalized_text: str) -> tuple[int, ...]:
+    words = normalized_text.split()
+    shingles = {
+        " ".join(words[idx:idx + SHINGLE_WORDS])
+        for idx in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+    }
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles
+    ]
+    return tuple(
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def minhash_similarity(left: tuple[int, ...], right: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def lsh_band_keys(signature: tuple[int, ...]) -> list[str]:
+    """Band keys shared by documents likely to be near-duplicates."""
+    rows = len(signature) // MINHASH_BANDS
+    keys = []
+    for band in range(MINHASH_BANDS):
+        values = ",".join(str(value) for value in signature[band * rows:(band + 1) * rows])
+        keys.append(f"{band}:{hashlib.blake2b(values.encode('utf-8'), digest_size=8).hexdigest()}")
+    return keys
+
+
+def encode_minhash(signature: tuple[int, ...]) -> str:
+    return ",".join(str(value) for value in signature)
+
+
+def decode_minhash(value: str) -> tuple[int, ...]:
+    return tuple(int(part) for part in value.split(","))
+
+
+def fingerprint_document(text: str, with_minhash: bool = False) -> DocumentFingerprint:
+    """SHA-256 of the normalized text, plus a MinHash signature when requested."""
+    normalized = normalize_document(text)
+    return DocumentFingerprint(
+        fingerprint=hashlib.sha256(normalized.encode("utf-8")).hexdigest(),
+        minhash=minhash_signature(normalized) if with_minhash else None,
+    )
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Kept outside confirmation.db so the cache survives a rebuilt confirmation database.
+CACHE_DB_PATH = Path("DB") / "llm_cache.db"
+CACHE_TABLE = "llm_response_cache"
+MAX_ENTRIES = 200_000
+MAX_AGE_DAYS = 90
+
+
+def make_cache_key(
+    model: str,
+    system_prompt: str,
+    few_shot: str,
+    format_schema: dict,
+    raw_value,
+    prompt_layout: str = "field_first",
+) -> str:
+    """Content hash of everything that determines an LLM response."""
+    payload = json.dumps(
+        [model, system_prompt, few_shot, format_schema, str(raw_value), prompt_layout],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Persistent SQLite cache of raw LLM response contents keyed by content hash.
+
+    Safe to share between threads. Entries older than ``max_age_days`` and the
+    least recently used entries beyond ``max_entries`` are evicted on close.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = CACHE_DB_PATH,
+        max_entries: int = MAX_ENTRIES,
+        max_age_days: float = MAX_AGE_DAYS,
+    ):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_last_used "
+            f"ON {CACHE_TABLE}(last_used_at)"
+        )
+        self._conn.commit()
+
+    def get(self, cache_key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT response, created_at FROM {CACHE_TABLE} WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age_days * 86400:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                f"UPDATE {CACHE_TABLE} SET last_used_at = ? WHERE cache_key = ?",
+                (now, cache_key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, cache_key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"""
+                INSERT OR REPLACE INTO {CACHE_TABLE} (cache_key, response, created_at, last_used_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (cache_key, response, now, now),
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute(f"DELETE FROM {CACHE_TABLE} WHERE created_at < ?", (cutoff,))
+            removed = cur.rowcount
+            cur.execute(
+                f"""
+                DELETE FROM {CACHE_TABLE}
+                WHERE cache_key IN (
+                    SELECT cache_key FROM {CACHE_TABLE}
+                    ORDER BY last_used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            removed += cur.rowcount
+            self._conn.commit()
+            return removed
+
+    def close(self) -> None:
+        self.evict()
+        with self._lock:
+            self._conn.close()
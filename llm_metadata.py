@@ -1,4 +1,19 @@
 from dataclasses import dataclass
+from typing import Any, Callable
+
+from rule_extractors import (
+    extract_buy_sell,
+    extract_currency,
+    extract_isin,
+    extract_settlement_amount,
+    extract_settlement_date,
+    is_iso_date,
+    is_valid_currency,
+    is_valid_isin,
+)
+
+# Small model tried first for fields whose answers can be checked cheaply.
+FAST_MODEL = "llama3.2:1b"
 
 
 @dataclass(frozen=True)
@@ -9,6 +24,18 @@ class FieldLLMMetadata:
     few_shot: str
     system_prompt: str
     format_schema: dict
+    # Deterministic extractor tried before the LLM; returns None when it cannot
+    # find a value that passes validation.
+    rule_extractor: Callable[[str], Any] | None = None
+    # Case-insensitive labels used to cut the prompt down to the relevant lines.
+    anchors: tuple[str, ...] = ()
+    # Cheaper models tried, in order, before the parser's MODEL. An answer that
+    # fails value_matches_schema or disagrees with rule_extractor is escalated
+    # to the next model.
+    models: tuple[str, ...] = ()
+    # Format check for non-null answers beyond the JSON schema (check digits,
+    # code lists, ISO dates).
+    value_validator: Callable[[Any], bool] | None = None
 
 
 GENERAL_SYSTEM_PROMPT = """
@@ -67,6 +94,10 @@ FIELD_LLM_METADATA = {
             field_type="string",
             description="ISO-4217 3-letter currency code",
         ),
+        rule_extractor=extract_currency,
+        models=(FAST_MODEL,),
+        value_validator=is_valid_currency,
+        anchors=("Currency", "Ccy", "Net Consideration", "Net Amount", "Settlement Amount", "settlement_amount"),
     ),
     "settlement_amount": FieldLLMMetadata(
         source_column="settlement_amount",
@@ -94,6 +125,8 @@ FIELD_LLM_METADATA = {
             field_type="number",
             description="Normalized numeric settlement amount",
         ),
+        rule_extractor=extract_settlement_amount,
+        anchors=("Net Consideration", "Net Amount", "Settlement Amount", "settlement_amount", "Sett Amt", "Consideration"),
     ),
     "buy_sell": FieldLLMMetadata(
         source_column="buy_sell",
@@ -125,6 +158,9 @@ FIELD_LLM_METADATA = {
             "required": ["buy_sell"],
             "additionalProperties": False,
         },
+        rule_extractor=extract_buy_sell,
+        models=(FAST_MODEL,),
+        anchors=("buy", "sell", "bought", "sold", "purchase", "sale", "side", "direction"),
     ),
     "isin": FieldLLMMetadata(
         source_column="isin",
@@ -148,6 +184,10 @@ FIELD_LLM_METADATA = {
             field_type="string",
             description="12-character ISIN",
         ),
+        rule_extractor=extract_isin,
+        models=(FAST_MODEL,),
+        value_validator=is_valid_isin,
+        anchors=("ISIN",),
     ),
     "settlement_date": FieldLLMMetadata(
         source_column="settlement_date",
@@ -172,6 +212,10 @@ FIELD_LLM_METADATA = {
             field_type="string",
             description="Settlement date normalized to YYYY-MM-DD",
         ),
+        rule_extractor=extract_settlement_date,
+        models=(FAST_MODEL,),
+        value_validator=is_iso_date,
+        anchors=("Settlement Date", "settlement_date", "Sett Date", "Value Date"),
     ),
     "SSI": FieldLLMMetadata(
         source_column="SSI",
@@ -197,5 +241,80 @@ FIELD_LLM_METADATA = {
             field_type="string",
             description="Standard settlement instruction text",
         ),
+        anchors=("SSI", "Settlement Instructions", "Delivery Instructions", "Delivery Versus Payment", "ssi_begin"),
     ),
 }
+
+
+_SCHEMA_PYTHON_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+def _field_specific_rules(metadata: FieldLLMMetadata) -> str:
+    return metadata.system_prompt.split("Field-specific extraction rules:\n", 1)[-1]
+
+
+def build_combined_system_prompt(metadata_list: list[FieldLLMMetadata]) -> str:
+    """Merge field-specific rules of several fields into one multi-field system prompt."""
+    sections = [
+        f"Field `{metadata.output_key}`:\n{_field_specific_rules(metadata)}"
+        for metadata in metadata_list
+    ]
+    return (
+        f"{GENERAL_SYSTEM_PROMPT}\n"
+        "- Return every field requested by the schema in one JSON object.\n\n"
+        "Field-specific extraction rules:\n\n" + "\n\n".join(sections)
+    )
+
+
+def build_combined_few_shot(metadata_list: list[FieldLLMMetadata]) -> str:
+    return "\n\n".join(
+        f"Examples for `{metadata.output_key}`:\n{metadata.few_shot}"
+        for metadata in metadata_list
+    )
+
+
+def build_combined_schema(metadata_list: list[FieldLLMMetadata]) -> dict:
+    """Merge single-field JSON schemas into one object schema requiring all fields."""
+    properties = {}
+    for metadata in metadata_list:
+        properties.update(metadata.format_schema["properties"])
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def value_matches_schema(metadata: FieldLLMMetadata, value, validate: bool = True) -> bool:
+    """Check a parsed value against the field's type and enum constraints.
+
+    ``validate`` also applies the field's value_validator.
+    """
+    field_schema = metadata.format_schema["properties"][metadata.output_key]
+    allowed_types = field_schema.get("type", [])
+    if isinstance(allowed_types, str):
+        allowed_types = [allowed_types]
+
+    type_ok = False
+    for type_name in allowed_types:
+        python_types = _SCHEMA_PYTHON_TYPES.get(type_name, ())
+        if isinstance(value, bool) and type_name in ("number", "integer"):
+            continue
+        if isinstance(value, python_types):
+            type_ok = True
+            break
+    if not type_ok:
+        return False
+
+    if "enum" in field_schema and value not in field_schema["enum"]:
+        return False
+    if validate and value is not None and metadata.value_validator is not None:
+        return metadata.value_validator(value)
+    return True
@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import date, timedelta
+
+TABLE_NAME = "confirmation_data"
+STATS_TABLE = "daily_match_stats"
+DISTRIBUTION_TABLE = "daily_match_distribution"
+# Days whose summary rows may count a row that has since moved to another day;
+# filled by a trigger on creation_date and emptied when those days are recomputed.
+STALE_DAYS_TABLE = "daily_match_stale_days"
+VALIDATION_COLUMNS = [
+    "currency_validation",
+    "settlement_amount_validation",
+    "buy_sell_validation",
+    "isin_validation",
+    "settlement_date_validation",
+    "SSI_validation",
+]
+# Day bucket of a row; rows without a creation_date are kept under ''.
+DAY_SQL = "coalesce(substr(creation_date, 1, 10), '')"
+MATCHED_FIELD_COUNT_SQL = " + ".join(f"({col} IS 'matched')" for col in VALIDATION_COLUMNS)
+
+
+def create_match_stats_tables(conn: sqlite3.Connection) -> bool:
+    """Create the summary tables; return True when they did not exist yet."""
+    existing = conn.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        (STATS_TABLE, DISTRIBUTION_TABLE),
+    ).fetchone()[0]
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            day TEXT NOT NULL,
+            field TEXT NOT NULL,
+            matched INTEGER NOT NULL,
+            unmatched INTEGER NOT NULL,
+            null_count INTEGER NOT NULL,
+            PRIMARY KEY (day, field)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {DISTRIBUTION_TABLE} (
+            day TEXT NOT NULL,
+            matched_fields INTEGER NOT NULL,
+            transactions INTEGER NOT NULL,
+            PRIMARY KEY (day, matched_fields)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {STALE_DAYS_TABLE} (day TEXT PRIMARY KEY) WITHOUT ROWID"
+    )
+    return existing < 2
+
+
+def _day_filter(day: str) -> tuple[str, list]:
+    """creation_date range for one day bucket, so the creation_date index is used."""
+    if not day:
+        return "creation_date IS NULL", []
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    return "creation_date >= ? AND creation_date < ?", [day, next_day]
+
+
+def _insert_stats(conn: sqlite3.Connection, where: str, params: list) -> None:
+    for col in VALIDATION_COLUMNS:
+        conn.execute(
+            f"""
+            INSERT INTO {STATS_TABLE} (day, field, matched, unmatched, null_count)
+            SELECT {DAY_SQL}, ?, sum({col} IS 'matched'), sum({col} IS 'unmatched'),
+                   sum({col} IS NULL)
+            FROM {TABLE_NAME}
+            WHERE {where}
+            GROUP BY 1
+            """,
+            [col.replace("_validation", ""), *params],
+        )
+    conn.execute(
+        f"""
+        INSERT INTO {DISTRIBUTION_TABLE} (day, matched_fields, transactions)
+        SELECT {DAY_SQL}, {MATCHED_FIELD_COUNT_SQL}, count(*)
+        FROM {TABLE_NAME}
+        WHERE {where}
+        GROUP BY 1, 2
+        """,
+        params,
+    )
+
+
+def refresh_daily_match_stats(conn: sqlite3.Connection, days=None) -> None:
+    """Recompute the summary rows for ``days`` (day strings), or rebuild both tables.
+
+    Each day is recomputed from confirmation_data in full, so the result does
+    not depend on what changed within it. The caller commits.
+    """
+    if days is None:
+        conn.execute(f"DELETE FROM {STATS_TABLE}")
+        conn.execute(f"DELETE FROM {DISTRIBUTION_TABLE}")
+        conn.execute(f"DELETE FROM {STALE_DAYS_TABLE}")
+        _insert_stats(conn, "1 = 1", [])
+        return
+
+    for day in sorted(set(days)):
+        conn.execute(f"DELETE FROM {STATS_TABLE} WHERE day = ?", (day,))
+        conn.execute(f"DELETE FROM {DISTRIBUTION_TABLE} WHERE day = ?", (day,))
+        conn.execute(f"DELETE FROM {STALE_DAYS_TABLE} WHERE day = ?", (day,))
+        where, params = _day_filter(day)
+        _insert_stats(conn, where, params)
@@ -0,0 +1,193 @@
+import contextlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_metadata import FIELD_LLM_METADATA
+from text_windows import estimate_tokens
+
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 11434
+# Seconds each chat request takes before it is answered.
+MOCK_LATENCY_SECONDS = 0.0
+# Share of chat requests answered with HTTP 503, to exercise client retries.
+MOCK_ERROR_RATE = 0.0
+# Chat requests answered at once, like OLLAMA_NUM_PARALLEL; others queue. None is unlimited.
+MOCK_NUM_PARALLEL: int | None = None
+# Answer for fields that cannot be read from the prompt.
+DEFAULT_ANSWERS = {
+    "currency": "USD",
+    "settlement_amount": 1000000.0,
+    "buy_sell": "BUY",
+    "isin": "US0378331005",
+    "settlement_date": "2025-01-02",
+    "SSI": "PSET DTCYUS33",
+}
+_METADATA_BY_KEY = {metadata.output_key: metadata for metadata in FIELD_LLM_METADATA.values()}
+
+
+def _line_after_anchor(prompt: str, anchors: tuple[str, ...]) -> str | None:
+    lines = [line.strip() for line in prompt.splitlines()]
+    for idx, line in enumerate(lines[:-1]):
+        if any(line.lower().startswith(anchor.lower()) for anchor in anchors) and lines[idx + 1]:
+            return lines[idx + 1]
+    return None
+
+
+def _answer(properties: dict, prompt: str) -> dict:
+    """Deterministic answer read from the prompt, else a fixed default.
+
+    Fields with a rule extractor use it; the others take the line after
+    their first anchor label.
+    """
+    answer = {}
+    for key in properties:
+        metadata = _METADATA_BY_KEY.get(key)
+        value = None
+        if metadata is not None and metadata.rule_extractor is not None:
+            value = metadata.rule_extractor(prompt)
+        elif metadata is not None:
+            value = _line_after_anchor(prompt, metadata.anchors)
+        answer[key] = value if value is not None else DEFAULT_ANSWERS.get(key)
+    return answer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockOllamaServer"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        if self.path == "/api/version":
+            self._send_json({"version": "mock"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"status": "Ollama is running"})
+
+    def do_POST(self) -> None:
+        if self.path != "/api/chat":
+            self._send_json({"error": f"unsupported endpoint {self.path}"}, status=404)
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        started = time.perf_counter()
+        with self.server.slots:
+            if self.server.latency_seconds:
+                time.sleep(self.server.latency_seconds)
+        if self.server.should_fail():
+            self._send_json({"error": "mock server overloaded"}, status=503)
+            return
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        properties = (request.get("format") or {}).get("properties") or {}
+        content = json.dumps(_answer(properties, prompt))
+        self.server.count_request()
+
+        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+        self._send_json(
+            {
+                "model": request.get("model"),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": estimate_tokens(prompt),
+                "eval_count": estimate_tokens(content),
+                "prompt_eval_duration": elapsed_ns // 2,
+                "eval_duration": elapsed_ns - elapsed_ns // 2,
+                "load_duration": 0,
+                "total_duration": elapsed_ns,
+            }
+        )
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """Local stand-in for the Ollama chat API with fixed latency and deterministic answers.
+
+    Use as a context manager; ``url`` is the value for OLLAMA_HOST. Port 0
+    picks a free port. ``error_rate`` of the chat requests fail with HTTP 503.
+    At most ``num_parallel`` requests are answered at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = MOCK_HOST,
+        port: int = 0,
+        latency_seconds: float = MOCK_LATENCY_SECONDS,
+        error_rate: float = MOCK_ERROR_RATE,
+        num_parallel: int | None = MOCK_NUM_PARALLEL,
+    ):
+        super().__init__((host, port), _Handler)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.slots = (
+            threading.Semaphore(num_parallel) if num_parallel else contextlib.nullcontext()
+        )
+        self.requests = 0
+        self.failed_requests = 0
+        self._rng = random.Random(0)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.failed_requests += 1
+            return failed
+
+    def start(self) -> "MockOllamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = MockOllamaServer(
+        MOCK_HOST, MOCK_PORT, MOCK_LATENCY_SECONDS, MOCK_ERROR_RATE, MOCK_NUM_PARALLEL
+    )
+    print(f"Mock Ollama listening on {server.url} (latency {MOCK_LATENCY_SECONDS}s, Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,277 @@
+import random
+import threading
+import time
+
+import httpx
+import ollama
+
+# Ollama servers to spread calls over; None uses the OLLAMA_HOST environment
+# variable, else http://127.0.0.1:11434.
+OLLAMA_HOSTS: tuple[str | None, ...] = (None,)
+# "least_outstanding" sends each call to the host with the fewest requests in
+# flight; "latency_weighted" also weighs that count by the host's recent latency.
+BALANCING = "least_outstanding"
+# Weight of the newest call in a host's moving-average latency.
+LATENCY_SMOOTHING = 0.2
+CONNECT_TIMEOUT_SECONDS = 5.0
+# Per-request limit for reading a chat response; long enough for a cold model load.
+REQUEST_TIMEOUT_SECONDS = 300.0
+# Kept-alive HTTP connections per host reused across calls; match it to the parser's workers.
+MAX_CONNECTIONS = 16
+# Retries after the first attempt of a call that failed with a retryable error.
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+# Consecutive failed attempts that open a host's circuit. An open host gets no
+# calls until a health check passes, or CIRCUIT_RESET_SECONDS have passed and
+# one trial call succeeds.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+# Seconds between /api/version pings of every host; 0 disables health checks.
+HEALTH_CHECK_INTERVAL_SECONDS = 10.0
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+
+# HTTP status codes worth retrying: overload and server-side failures.
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMCallError(Exception):
+    """A chat call that failed; ``retryable`` is False for errors a retry cannot fix."""
+
+    def __init__(self, message: str, retryable: bool = True, status_code: int | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        # HTTP status of the server's answer, e.g. 404 for a model that is not pulled.
+        self.status_code = status_code
+
+
+class CircuitOpenError(LLMCallError):
+    """Raised without calling a server while every host's circuit is open."""
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, ollama.ResponseError):
+        return exc.status_code in _RETRYABLE_STATUS_CODES
+    # ollama raises the builtin ConnectionError when it cannot connect.
+    return isinstance(exc, (ConnectionError, httpx.TransportError))
+
+
+class _Host:
+    """One Ollama server with its connection pool, load and circuit state.
+
+    Everything but the clients is guarded by the owning OllamaClient's lock.
+    """
+
+    def __init__(self, host: str | None, timeout_seconds: float, max_connections: int):
+        self.client = ollama.Client(
+            host=host,
+            timeout=httpx.Timeout(timeout_seconds, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+        # ollama.Client keeps its httpx client private and has no close().
+        self.http: httpx.Client = self.client._client
+        self.url = str(self.http.base_url)
+        # Health pings get their own connection so a busy chat pool cannot fail them.
+        self.health_http = httpx.Client(
+            base_url=self.http.base_url,
+            timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        )
+        self.outstanding = 0
+        self.latency: float | None = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until: float | None = None
+        self.trial_in_flight = False
+
+    def load(self, balancing: str) -> float:
+        if balancing == "latency_weighted":
+            # Hosts without a latency yet are tried first.
+            return (self.outstanding + 1) * (self.latency or 0.0)
+        return self.outstanding
+
+
+class OllamaClient:
+    """Thread-safe Ollama chat client over one or more hosts.
+
+    Each call goes to the available host with the lowest load (see
+    BALANCING) over that host's pooled connections. Calls have timeouts,
+    and a failed call is retried on another host when one is available.
+    A circuit breaker drains a host that keeps failing until a health check
+    or a trial call succeeds. ``chat`` takes the arguments of ``ollama.chat``
+    and raises LLMCallError once the retries are used up, or
+    CircuitOpenError while every host is drained.
+    """
+
+    def __init__(
+        self,
+        hosts=OLLAMA_HOSTS,
+        timeout_seconds: float = REQUEST_TIMEOUT_SECONDS,
+        max_connections: int = MAX_CONNECTIONS,
+        max_retries: int = MAX_RETRIES,
+        balancing: str = BALANCING,
+        health_check_interval_seconds: float = HEALTH_CHECK_INTERVAL_SECONDS,
+    ):
+        if balancing not in ("least_outstanding", "latency_weighted"):
+            raise ValueError(f"Unknown balancing: {balancing}")
+        if hosts is None or isinstance(hosts, str):
+            hosts = (hosts,)
+        self._hosts = [_Host(host, timeout_seconds, max_connections) for host in hosts]
+        if not self._hosts:
+            raise ValueError("At least one Ollama host is required")
+        self.max_retries = max_retries
+        self.balancing = balancing
+        self.retries = 0
+        self.circuit_opened = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._health_thread: threading.Thread | None = None
+        if health_check_interval_seconds > 0:
+            self._health_thread = threading.Thread(
+                target=self._health_loop,
+                args=(health_check_interval_seconds,),
+                name="ollama-health-check",
+                daemon=True,
+            )
+            self._health_thread.start()
+
+    @property
+    def hosts(self) -> list[str]:
+        return [host.url for host in self._hosts]
+
+    def host_stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "host": host.url,
+                    "requests": host.requests,
+                    "failures": host.failures,
+                    "latency_seconds": host.latency,
+                    "available": host.open_until is None,
+                }
+                for host in self._hosts
+            ]
+
+    def _acquire(self, tried: set[str]) -> tuple[_Host, bool]:
+        """Pick the host for the next attempt, preferring hosts not in ``tried``.
+
+        Returns the host and whether the attempt is its half-open trial call.
+        """
+        with self._lock:
+            available = [host for host in self._hosts if host.open_until is None]
+            candidates = [host for host in available if host.url not in tried] or available
+            trial = not candidates
+            if trial:
+                now = time.monotonic()
+                candidates = [
+                    host
+                    for host in self._hosts
+                    if host.open_until <= now and not host.trial_in_flight
+                ][:1]
+                if not candidates:
+                    raise CircuitOpenError(f"circuit open for all {len(self._hosts)} Ollama host(s)")
+            # Rotating the tie-break spreads equal loads over every host.
+            count = len(self._hosts)
+            host = min(
+                candidates,
+                key=lambda item: (
+                    item.load(self.balancing),
+                    (self._hosts.index(item) - self._next) % count,
+                ),
+            )
+            self._next = (self._hosts.index(host) + 1) % count
+            host.outstanding += 1
+            host.requests += 1
+            host.trial_in_flight = host.trial_in_flight or trial
+            return host, trial
+
+    def _release(self, host: _Host, trial: bool, succeeded: bool, wall_seconds: float) -> None:
+        with self._lock:
+            host.outstanding -= 1
+            if trial:
+                host.trial_in_flight = False
+            if succeeded:
+                host.latency = (
+                    wall_seconds
+                    if host.latency is None
+                    else LATENCY_SMOOTHING * wall_seconds + (1 - LATENCY_SMOOTHING) * host.latency
+                )
+                host.consecutive_failures = 0
+                host.open_until = None
+                return
+            host.failures += 1
+            host.consecutive_failures += 1
+            if trial or host.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self._open_circuit(host)
+
+    def _open_circuit(self, host: _Host) -> None:
+        """Drain ``host``; call with the lock held."""
+        if host.open_until is None:
+            self.circuit_opened += 1
+            print(f"Ollama at {host.url} is failing; draining it for {CIRCUIT_RESET_SECONDS:.0f}s")
+        host.open_until = time.monotonic() + CIRCUIT_RESET_SECONDS
+
+    def chat(self, **kwargs):
+        attempt = 0
+        tried: set[str] = set()
+        while True:
+            host, trial = self._acquire(tried)
+            started = time.perf_counter()
+            try:
+                response = host.client.chat(**kwargs)
+            except Exception as exc:
+                retryable = _is_retryable(exc)
+                # Client errors (unknown model, bad request) say nothing about server health.
+                self._release(host, trial, not retryable, time.perf_counter() - started)
+                message = f"{type(exc).__name__} from {host.url}: {exc}"
+                if not retryable:
+                    raise LLMCallError(
+                        message, retryable=False, status_code=getattr(exc, "status_code", None)
+                    ) from exc
+                tried.add(host.url)
+                with self._lock:
+                    available = [item for item in self._hosts if item.open_until is None]
+                    if attempt < self.max_retries and available:
+                        self.retries += 1
+                if attempt >= self.max_retries or not available:
+                    raise LLMCallError(f"{message} (after {attempt + 1} attempt(s))") from exc
+                if all(item.url in tried for item in available):
+                    delay = min(BACKOFF_BASE_SECONDS * 2 ** attempt, BACKOFF_MAX_SECONDS)
+                    # Full jitter keeps concurrent workers from retrying in lockstep.
+                    time.sleep(random.uniform(0, delay))
+                attempt += 1
+                continue
+            self._release(host, trial, True, time.perf_counter() - started)
+            return response
+
+    def check_health(self) -> None:
+        """Ping every host: drain the ones that do not answer, restore the ones that do."""
+        for host in self._hosts:
+            try:
+                host.health_http.get("/api/version").raise_for_status()
+                healthy = True
+            except httpx.HTTPError:
+                healthy = False
+            with self._lock:
+                if healthy and host.open_until is not None:
+                    host.consecutive_failures = 0
+                    host.open_until = None
+                    print(f"Ollama at {host.url} is healthy again")
+                elif not healthy:
+                    self._open_circuit(host)
+
+    def _health_loop(self, interval_seconds: float) -> None:
+        while not self._closed.wait(interval_seconds):
+            self.check_health()
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+        for host in self._hosts:
+            host.http.close()
+            host.health_http.close()
@@ -1,7 +1,19 @@
+import hashlib
+import json
 import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import fitz
 
+PDF_INPUT_DIR = Path("utility") / "Exports_2026-01-30_15-22-57"
+OUTPUT_DIR = Path("External_Data")
+MANIFEST_NAME = "pdf_manifest.json"
+WORKERS = os.cpu_count() or 1
+_TX_FILE_PATTERN = re.compile(r"^TX(\d{6})\.txt$")
+
+
 def list_files(folder_path):
     """List all files in a folder."""
     return [
@@ -9,47 +21,115 @@ def list_files(folder_path):
         if os.path.isfile(os.path.join(folder_path, f))
     ]
 
-def extract_text_from_pdfs(input_folder):
-    """Extract text from all PDF files in a folder."""
-    files = list_files(input_folder)
-    documents = []
-    
+
+def file_sha256(file_path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_document_text(pdf_path) -> str:
+    """Extract one PDF and join its pages into a single document text."""
+    with fitz.open(pdf_path) as doc:  # type: ignore
+        return "\n".join(page.get_text("text") for page in doc)
+
+
+def _extract_or_error(pdf_path) -> tuple[str | None, str | None]:
     try:
-        for file in files:
-            file_path = os.path.join(input_folder, file)
-            msg = fitz.open(file_path) # type: ignore
-            documents.append(msg)
+        return extract_document_text(pdf_path), None
     except Exception as e:
-        print(f"Error opening files: {e}")
-    
-    # Extract text from all pages
-    details = []
-    for doc in documents:
-        for page in doc:
-            text = page.get_text("text")
-            details.append(text)
-    
-    return details
-
-def save_texts_as_txt(text_list, output_dir):
-    """Save text list to individual txt files."""
+        return None, str(e)
+
+
+def write_text_atomic(file_path: Path, text: str) -> None:
+    """Write through a temporary file so readers never see a partial document."""
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    """Manifest of ingested PDFs: ``{"documents": {sha256: {"pdf": name, "id": tx_id}}}``."""
+    if not manifest_path.exists():
+        return {"documents": {}}
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+def _save_manifest(manifest_path: Path, manifest: dict) -> None:
+    write_text_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def _next_tx_id(output_dir: Path, manifest: dict) -> int:
+    used_ids = [entry["id"] for entry in manifest["documents"].values()]
+    if output_dir.exists():
+        for name in os.listdir(output_dir):
+            match = _TX_FILE_PATTERN.match(name)
+            if match:
+                used_ids.append(int(match.group(1)))
+    return max(used_ids, default=0) + 1
+
+
+def ingest_pdfs(
+    input_folder=PDF_INPUT_DIR,
+    output_dir: Path = OUTPUT_DIR,
+    manifest_path: Path | None = None,
+    workers: int = WORKERS,
+) -> list[tuple[str, int]]:
+    """Extract new PDFs into ``TX{id:06d}.txt`` files, one document per file.
+
+    PDFs whose content hash is already in the manifest are skipped. Documents
+    are extracted in a process pool and written one at a time, and the
+    manifest is saved after each one so an interrupted run can resume.
+    """
+    input_folder = Path(input_folder)
     output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = manifest_path or output_dir / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+
+    pending: list[tuple[Path, str]] = []
+    seen_hashes = set(manifest["documents"])
+    for name in sorted(list_files(input_folder)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        pdf_path = input_folder / name
+        sha256 = file_sha256(pdf_path)
+        if sha256 in seen_hashes:
+            continue
+        seen_hashes.add(sha256)
+        pending.append((pdf_path, sha256))
+
+    if not pending:
+        print(f"No new PDFs in {input_folder}")
+        return []
+
+    ingested = []
+    next_id = _next_tx_id(output_dir, manifest)
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = pool.map(_extract_or_error, [str(path) for path, _ in pending])
+        for (pdf_path, sha256), (text, error) in zip(pending, results):
+            if error is not None:
+                print(f"Error opening {pdf_path.name}: {error}")
+                continue
+            tx_id = next_id
+            next_id += 1
+            write_text_atomic(output_dir / f"TX{tx_id:06d}.txt", text)
+            manifest["documents"][sha256] = {"pdf": pdf_path.name, "id": tx_id}
+            _save_manifest(manifest_path, manifest)
+            ingested.append((pdf_path.name, tx_id))
+            print(f"{pdf_path.name} -> TX{tx_id:06d}.txt")
+
+    print(f"✓ Successfully ingested {len(ingested)} PDF(s) into {output_dir}")
+    return ingested
 
-    for idx, text in enumerate(text_list, start=1):
-        file_path = output_dir / f"dummy_{idx}.txt"
-        file_path.write_text(text, encoding="utf-8")
-    
-    print(f"✓ Successfully saved {len(text_list)} files to {output_dir}")
 
 if __name__ == "__main__":
-    input_folder = "./test/Exports_2026-01-30_15-22-57"
-    output_folder = "./External_Data/dummy"
-    
-    # Extract text from PDFs
-    print(f"Extracting text from PDFs in {input_folder}...")
-    extracted_text = extract_text_from_pdfs(input_folder)
-    
-    # Save to txt files
-    print(f"Saving extracted text to {output_folder}...")
-    save_texts_as_txt(extracted_text, output_folder)
+    print(f"Extracting text from PDFs in {PDF_INPUT_DIR}...")
+    ingest_pdfs()
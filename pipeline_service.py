@@ -0,0 +1,174 @@
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from confirmation_parser import (
+    DB_PATH,
+    EXTERNAL_DATA_DIR,
+    FETCH_CHUNK_SIZE,
+    process_new_raw_rows,
+    reset_llm_values,
+)
+from pdf_to_text import ingest_pdfs
+
+PDF_DROP_DIR = Path("PDF_Inbox")
+POLL_INTERVAL_SECONDS = 1.0
+_TX_FILE_PATTERN = re.compile(r"^TX(\d{6})\.txt$")
+
+
+def _snapshot(folder: Path, suffix: str) -> dict[Path, tuple[int, int]]:
+    """Map files with ``suffix`` to their (mtime_ns, size) signature."""
+    if not folder.exists():
+        return {}
+    signatures = {}
+    for entry in folder.iterdir():
+        if entry.name.lower().endswith(suffix) and entry.is_file():
+            stat = entry.stat()
+            signatures[entry] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class FolderWatcher(threading.Thread):
+    """Poll a folder and queue files that are new or changed.
+
+    A file is queued only once its signature is unchanged across two polls,
+    so half-copied files are not picked up.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        suffix: str,
+        events: queue.Queue,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        super().__init__(name=f"watch-{folder}", daemon=True)
+        self.folder = folder
+        self.suffix = suffix
+        self.events = events
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
+        # Files present at startup count as already handled.
+        self._handled = _snapshot(folder, suffix)
+        self._previous = dict(self._handled)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.poll_interval):
+            current = _snapshot(self.folder, self.suffix)
+            ready = [
+                path
+                for path, signature in current.items()
+                if self._previous.get(path) == signature and self._handled.get(path) != signature
+            ]
+            for path in ready:
+                self._handled[path] = current[path]
+            if ready:
+                self.events.put((self.folder, sorted(ready)))
+            self._previous = current
+
+
+def _tx_row_ids(paths: list[Path]) -> list[int]:
+    row_ids = []
+    for path in paths:
+        match = _TX_FILE_PATTERN.match(path.name)
+        if match:
+            row_ids.append(int(match.group(1)))
+    return row_ids
+
+
+def _existing_row_ids(db_path: Path, row_ids) -> set[int]:
+    row_ids = list(row_ids)
+    existing = set()
+    conn = sqlite3.connect(db_path)
+    try:
+        for start in range(0, len(row_ids), FETCH_CHUNK_SIZE):
+            batch = row_ids[start:start + FETCH_CHUNK_SIZE]
+            existing.update(
+                row[0]
+                for row in conn.execute(
+                    f"SELECT id FROM confirmation_data WHERE id IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
+            )
+    finally:
+        conn.close()
+    return existing
+
+
+def run_pipeline_service(
+    db_path: Path = DB_PATH,
+    text_dir: Path = EXTERNAL_DATA_DIR,
+    pdf_drop_dir: Path = PDF_DROP_DIR,
+    poll_interval: float = POLL_INTERVAL_SECONDS,
+) -> None:
+    """Continuously ingest dropped PDFs and extract/validate new or changed confirmations.
+
+    New PDFs become ``TX######.txt`` files via pdf_to_text. New or changed
+    text files have their *_LLM values cleared and are re-extracted and
+    validated for just those rows. A text file whose confirmation_data row
+    does not exist yet (e.g. a dropped PDF ahead of its WSS load) waits and is
+    extracted once the row appears.
+    """
+    pdf_drop_dir.mkdir(parents=True, exist_ok=True)
+    events: queue.Queue = queue.Queue()
+    watchers = [
+        FolderWatcher(pdf_drop_dir, ".pdf", events, poll_interval),
+        FolderWatcher(text_dir, ".txt", events, poll_interval),
+    ]
+    for watcher in watchers:
+        watcher.start()
+
+    print(f"Catching up on pending rows in {db_path}...")
+    process_new_raw_rows(db_path, text_dir=text_dir)
+    print(f"Watching {text_dir} and {pdf_drop_dir} (Ctrl+C to stop)")
+
+    # TX ids whose text file exists but whose row has not been loaded yet.
+    waiting: set[int] = set()
+    try:
+        while True:
+            try:
+                events_batch = [events.get(timeout=poll_interval)]
+            except queue.Empty:
+                events_batch = []
+            # Coalesce events that queued up while the previous batch ran.
+            while not events.empty():
+                events_batch.append(events.get_nowait())
+
+            row_ids: set[int] = set()
+            for folder, paths in events_batch:
+                if folder == pdf_drop_dir:
+                    # Written TX files are picked up by the text watcher on its next poll.
+                    ingest_pdfs(pdf_drop_dir, output_dir=text_dir)
+                else:
+                    row_ids.update(_tx_row_ids(paths))
+            row_ids |= waiting
+            if not row_ids:
+                continue
+
+            existing = _existing_row_ids(db_path, row_ids)
+            for row_id in sorted(row_ids - existing - waiting):
+                print(f"TX{row_id:06d}: waiting for its confirmation_data row")
+            waiting = row_ids - existing
+            row_ids = existing
+            if not row_ids:
+                continue
+
+            started = time.monotonic()
+            reset_llm_values(db_path, row_ids)
+            count = process_new_raw_rows(db_path, row_ids=row_ids, text_dir=text_dir)
+            print(
+                f"Processed {len(row_ids)} confirmation(s), {count} value(s) "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+    except KeyboardInterrupt:
+        print("Stopping pipeline service.")
+    finally:
+        for watcher in watchers:
+            watcher.stopped.set()
+
+
+if __name__ == "__main__":
+    run_pipeline_service()
@@ -0,0 +1,183 @@
+import re
+from datetime import date, datetime
+
+ISO_4217_CODES = frozenset(
+    """
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB
+    BRL BSD BTN BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP
+    DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF
+    IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT LAK
+    LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN
+    NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF
+    SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SYP SZL THB TJS TMT TND TOP
+    TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF XPF YER ZAR
+    ZMW ZWL
+    """.split()
+)
+
+# Unambiguous formats only; numeric day/month orderings such as 01/02/2025 are left to the LLM.
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%d %b %Y",
+    "%d %B %Y",
+    "%b %d, %Y",
+    "%B %d, %Y",
+    "%b %d %Y",
+    "%B %d %Y",
+    "%d-%b-%Y",
+    "%d-%b-%y",
+    "%d %b %y",
+    "%d.%m.%Y",
+    "%Y%m%d",
+)
+
+_ISIN_PATTERN = re.compile(r"\b([A-Z]{2}[A-Z0-9]{9}[0-9])\b")
+_CURRENCY_PATTERN = re.compile(r"\b([A-Z]{3})\b")
+# An optional currency code followed by one amount and nothing else: comma-grouped
+# digits, or plain digits whose decimals cannot be read as a dot-grouped thousand.
+# Dot or space grouping, trailing signs and extra numbers are left to the LLM.
+_AMOUNT_PATTERN = re.compile(
+    r"(?:(?P<code>[A-Z]{3})\s*)?"
+    r"(?P<amount>[-(]?(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.(?:\d{1,2}|\d{4,}))?)\)?)",
+    re.IGNORECASE,
+)
+_BUY_SELL_TOKENS = {"BUY": "BUY", "B": "BUY", "SELL": "SELL", "S": "SELL"}
+# Phrases are read from the counterparty's perspective, as in the buy_sell prompt.
+_BUY_PHRASES = re.compile(
+    r"\b(?:you bought|we (?:have )?sold|your purchase)\b", re.IGNORECASE
+)
+_SELL_PHRASES = re.compile(
+    r"\b(?:you sold|we (?:have )?bought|your sale)\b", re.IGNORECASE
+)
+
+
+def labeled_value(text: str, labels: tuple[str, ...]) -> str | None:
+    """Return the value following the first matching ``Label:`` line.
+
+    The value may sit on the same line as the label or on the next non-empty line.
+    """
+    lines = text.splitlines()
+    for label in labels:
+        pattern = re.compile(rf"^\s*{re.escape(label)}\s*:\s*(.*)$", re.IGNORECASE)
+        for idx, line in enumerate(lines):
+            match = pattern.match(line)
+            if not match:
+                continue
+            value = match.group(1).strip()
+            if value:
+                return value
+            for next_line in lines[idx + 1:]:
+                if next_line.strip():
+                    return next_line.strip()
+    return None
+
+
+def is_valid_isin(value: str) -> bool:
+    """Validate ISIN structure and its Luhn check digit."""
+    if not isinstance(value, str) or not _ISIN_PATTERN.fullmatch(value):
+        return False
+    digits = "".join(str(int(char, 36)) for char in value)
+    total = 0
+    for idx, char in enumerate(reversed(digits)):
+        digit = int(char)
+        if idx % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def is_valid_currency(value: str) -> bool:
+    return isinstance(value, str) and value in ISO_4217_CODES
+
+
+def is_iso_date(value: str) -> bool:
+    """True for a real calendar date written as YYYY-MM-DD."""
+    if not isinstance(value, str):
+        return False
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except ValueError:
+        return False
+
+
+def parse_date(value: str) -> date | None:
+    """Parse a date written in one of DATE_FORMATS."""
+    cleaned = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", value.strip())
+    cleaned = re.sub(r"\s+", " ", cleaned)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_amount(value: str) -> float | None:
+    """Parse an amount like ``EUR 1,250.50``, ``-1,250.50`` or ``(1,250.50)`` into a float.
+
+    Returns None unless the whole value is one unambiguous amount.
+    """
+    match = _AMOUNT_PATTERN.fullmatch(value.strip())
+    if not match or (match.group("code") and not is_valid_currency(match.group("code").upper())):
+        return None
+    token = match.group("amount")
+    if token.startswith("(") != token.endswith(")"):
+        return None
+    negative = token.startswith(("(", "-"))
+    amount = float(token.strip("()-").replace(",", ""))
+    return -amount if negative else amount
+
+
+def extract_currency(text: str) -> str | None:
+    value = labeled_value(text, ("Settlement Currency", "Sett Ccy", "Currency"))
+    if value is None:
+        value = labeled_value(
+            text, ("Net Consideration", "Net Amount", "Settlement Amount", "Sett Amt")
+        )
+    if value is None:
+        return None
+    # Case-sensitive, so words like "all" or "try" are not read as ALL or TRY.
+    codes = {code for code in _CURRENCY_PATTERN.findall(value) if is_valid_currency(code)}
+    return codes.pop() if len(codes) == 1 else None
+
+
+def extract_settlement_amount(text: str) -> float | None:
+    value = labeled_value(
+        text,
+        ("Net Consideration", "Net Amount", "Settlement Amount", "settlement_amount", "Sett Amt"),
+    )
+    return parse_amount(value) if value is not None else None
+
+
+def extract_isin(text: str) -> str | None:
+    value = labeled_value(text, ("ISIN",))
+    if value is None:
+        return None
+    valid = {
+        candidate for candidate in _ISIN_PATTERN.findall(value.upper()) if is_valid_isin(candidate)
+    }
+    return valid.pop() if len(valid) == 1 else None
+
+
+def extract_settlement_date(text: str) -> str | None:
+    value = labeled_value(text, ("Settlement Date", "settlement_date", "Sett Date", "Value Date"))
+    if value is None:
+        return None
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed is not None else None
+
+
+def extract_buy_sell(text: str) -> str | None:
+    value = labeled_value(text, ("Buy/Sell", "Buy / Sell", "buy_sell", "Side", "Direction"))
+    if value is not None:
+        token = value.split()[0].upper() if value.split() else ""
+        if token in _BUY_SELL_TOKENS:
+            return _BUY_SELL_TOKENS[token]
+
+    is_buy = bool(_BUY_PHRASES.search(text))
+    is_sell = bool(_SELL_PHRASES.search(text))
+    if is_buy != is_sell:
+        return "BUY" if is_buy else "SELL"
+    return None
@@ -1,9 +1,12 @@
+import io
 import sqlite3
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
+from match_stats import DISTRIBUTION_TABLE, STALE_DAYS_TABLE, STATS_TABLE
+
 
 DB_PATH = Path("DB") / "confirmation.db"
 TABLE_NAME = "confirmation_data"
@@ -39,36 +42,289 @@ DISPLAY_COLUMNS = [
 ]
 
 
-@st.cache_data
-def load_data(db_path: Path) -> pd.DataFrame:
-    conn = sqlite3.connect(db_path)
-    query = f"SELECT * FROM {TABLE_NAME}"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+MATCHED_FIELD_COUNT_SQL = " + ".join(f"({col} IS 'matched')" for col in VALIDATION_COLUMNS)
+PAGE_SIZE_OPTIONS = [50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+TABLE_HEIGHT = 420
+EXPORT_CHUNK_SIZE = 10_000
+# Cached query results are also dropped after this long, in case a write is
+# not reflected in the change token (e.g. a checkpointed WAL of equal size).
+CACHE_TTL_SECONDS = 300
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def db_change_token(db_path: Path) -> tuple:
+    """Cheap token that changes whenever the database is written.
+
+    Combines the mtime and size of the database and its WAL file with the
+    highest row id, so inserts and in-place updates both invalidate the
+    cached query results.
+    """
+    signature = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            signature.append(None)
+            continue
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    conn = _connect(db_path)
+    try:
+        max_id = conn.execute(f"SELECT max(id) FROM {TABLE_NAME}").fetchone()[0]
+    finally:
+        conn.close()
+    return (*signature, max_id)
+
+
+def _date_range_clause(start_date, end_date, column: str = "creation_date") -> tuple[str, list]:
+    """Index-friendly date filter covering whole days from start_date to end_date."""
+    if start_date is None or end_date is None:
+        return "1 = 1", []
+    next_day = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    return (
+        f"{column} >= ? AND {column} < ?",
+        [pd.Timestamp(start_date).strftime("%Y-%m-%d"), next_day.strftime("%Y-%m-%d")],
+    )
 
 
-def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
-    working = df.copy()
-    working["creation_date"] = pd.to_datetime(working["creation_date"], errors="coerce")
-    working["matched_field_count"] = (
-        (working[VALIDATION_COLUMNS] == "matched").sum(axis=1).astype(int)
-    )
-    working["unmatched_field_count"] = (
-        (working[VALIDATION_COLUMNS] == "unmatched").sum(axis=1).astype(int)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_date_bounds(db_path: Path, change_token: tuple):
+    conn = _connect(db_path)
+    try:
+        min_value, max_value = conn.execute(
+            f"SELECT min(creation_date), max(creation_date) FROM {TABLE_NAME}"
+        ).fetchone()
+    finally:
+        conn.close()
+    min_ts = pd.to_datetime(min_value, errors="coerce")
+    max_ts = pd.to_datetime(max_value, errors="coerce")
+    if pd.isna(min_ts) or pd.isna(max_ts):
+        return None
+    return min_ts.date(), max_ts.date()
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def summary_tables_current(db_path: Path, change_token: tuple, start_date, end_date) -> bool:
+    """True when the daily summary tables exist and are up to date for the selected days.
+
+    Rows waiting for validation, or days a row has moved away from, outside
+    the range do not matter.
+    """
+    conn = _connect(db_path)
+    try:
+        tables = conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+            (STATS_TABLE, DISTRIBUTION_TABLE, STALE_DAYS_TABLE),
+        ).fetchone()[0]
+        if tables < 3:
+            return False
+        where, params = _date_range_clause(start_date, end_date)
+        pending = conn.execute(
+            f"SELECT 1 FROM {TABLE_NAME} WHERE validation_pending = 1 AND {where} LIMIT 1",
+            params,
+        ).fetchone()
+        day_where, day_params = _date_range_clause(start_date, end_date, column="day")
+        stale = conn.execute(
+            f"SELECT 1 FROM {STALE_DAYS_TABLE} WHERE {day_where} LIMIT 1", day_params
+        ).fetchone()
+    finally:
+        conn.close()
+    return pending is None and stale is None
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_kpis(db_path: Path, change_token: tuple, start_date, end_date) -> dict:
+    if summary_tables_current(db_path, change_token, start_date, end_date):
+        where, params = _date_range_clause(start_date, end_date, column="day")
+        query = f"""
+            SELECT
+                coalesce(sum(transactions), 0),
+                coalesce(sum(transactions * (matched_fields = {len(VALIDATION_COLUMNS)})), 0),
+                coalesce(1.0 * sum(transactions * matched_fields) / sum(transactions), 0.0)
+            FROM {DISTRIBUTION_TABLE}
+            WHERE {where}
+            """
+    else:
+        where, params = _date_range_clause(start_date, end_date)
+        query = f"""
+            SELECT
+                count(*),
+                coalesce(sum(({MATCHED_FIELD_COUNT_SQL}) = {len(VALIDATION_COLUMNS)}), 0),
+                coalesce(avg({MATCHED_FIELD_COUNT_SQL}), 0.0)
+            FROM {TABLE_NAME}
+            WHERE {where}
+            """
+    conn = _connect(db_path)
+    try:
+        total, full_matches, avg_matched = conn.execute(query, params).fetchone()
+    finally:
+        conn.close()
+    return {
+        "total_transactions": total,
+        "full_match_count": full_matches,
+        "avg_matched_fields": avg_matched,
+    }
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_field_counts(db_path: Path, change_token: tuple, start_date, end_date) -> pd.DataFrame:
+    """Matched and unmatched counts per validation column."""
+    fields = [col.replace("_validation", "") for col in VALIDATION_COLUMNS]
+    conn = _connect(db_path)
+    try:
+        if summary_tables_current(db_path, change_token, start_date, end_date):
+            where, params = _date_range_clause(start_date, end_date, column="day")
+            totals = {
+                field: (matched, unmatched, matched + unmatched + null_count)
+                for field, matched, unmatched, null_count in conn.execute(
+                    f"""
+                    SELECT field, sum(matched), sum(unmatched), sum(null_count)
+                    FROM {STATS_TABLE}
+                    WHERE {where}
+                    GROUP BY field
+                    """,
+                    params,
+                )
+            }
+            matched = [totals.get(field, (0, 0, 0))[0] for field in fields]
+            unmatched = [totals.get(field, (0, 0, 0))[1] for field in fields]
+            total = max((value[2] for value in totals.values()), default=0)
+        else:
+            where, params = _date_range_clause(start_date, end_date)
+            selects = ", ".join(
+                f"coalesce(sum({col} IS 'matched'), 0), coalesce(sum({col} IS 'unmatched'), 0)"
+                for col in VALIDATION_COLUMNS
+            )
+            values = conn.execute(
+                f"SELECT count(*), {selects} FROM {TABLE_NAME} WHERE {where}",
+                params,
+            ).fetchone()
+            total, matched, unmatched = values[0], values[1::2], values[2::2]
+    finally:
+        conn.close()
+    return pd.DataFrame(
+        {
+            "field": fields,
+            "matched": matched,
+            "unmatched": unmatched,
+            "total": total,
+        }
     )
-    working["is_fully_matched"] = working["matched_field_count"] == len(VALIDATION_COLUMNS)
-    return working
 
 
-def apply_date_filter(df: pd.DataFrame) -> pd.DataFrame:
-    valid_dates = df["creation_date"].dropna()
-    if valid_dates.empty:
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_match_distribution(db_path: Path, change_token: tuple, start_date, end_date) -> pd.DataFrame:
+    if summary_tables_current(db_path, change_token, start_date, end_date):
+        where, params = _date_range_clause(start_date, end_date, column="day")
+        query = f"""
+            SELECT matched_fields, sum(transactions) AS transactions
+            FROM {DISTRIBUTION_TABLE}
+            WHERE {where}
+            GROUP BY 1
+            ORDER BY 1
+            """
+    else:
+        where, params = _date_range_clause(start_date, end_date)
+        query = f"""
+            SELECT {MATCHED_FIELD_COUNT_SQL} AS matched_fields, count(*) AS transactions
+            FROM {TABLE_NAME}
+            WHERE {where}
+            GROUP BY 1
+            ORDER BY 1
+            """
+    conn = _connect(db_path)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+
+def _transaction_filter(start_date, end_date, search: str = "") -> tuple[str, list]:
+    """Date range plus an optional search: digits match the id, anything else an ISIN prefix."""
+    where, params = _date_range_clause(start_date, end_date)
+    term = search.strip()
+    if term.isdigit():
+        where += " AND id = ?"
+        params.append(int(term))
+    elif term:
+        pattern = f"{term.upper()}%"
+        where += " AND (isin LIKE ? OR isin_LLM LIKE ?)"
+        params.extend([pattern, pattern])
+    return where, params
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_transaction_count(db_path: Path, change_token: tuple, start_date, end_date, search: str) -> int:
+    where, params = _transaction_filter(start_date, end_date, search)
+    conn = _connect(db_path)
+    try:
+        return conn.execute(f"SELECT count(*) FROM {TABLE_NAME} WHERE {where}", params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_transaction_page(
+    db_path: Path,
+    change_token: tuple,
+    start_date,
+    end_date,
+    search: str,
+    limit: int,
+    offset: int,
+) -> pd.DataFrame:
+    where, params = _transaction_filter(start_date, end_date, search)
+    conn = _connect(db_path)
+    try:
+        return pd.read_sql_query(
+            f"""
+            SELECT {", ".join(DISPLAY_COLUMNS)}
+            FROM {TABLE_NAME}
+            WHERE {where}
+            ORDER BY id
+            LIMIT ? OFFSET ?
+            """,
+            conn,
+            params=[*params, limit, offset],
+        )
+    finally:
+        conn.close()
+
+
+def export_transactions_csv(db_path: Path, start_date, end_date, search: str = "") -> bytes:
+    """Build the CSV export chunk by chunk; only called when the user asks for it."""
+    where, params = _transaction_filter(start_date, end_date, search)
+    buffer = io.StringIO()
+    conn = _connect(db_path)
+    try:
+        chunks = pd.read_sql_query(
+            f"SELECT {', '.join(DISPLAY_COLUMNS)} FROM {TABLE_NAME} WHERE {where} ORDER BY id",
+            conn,
+            params=params,
+            chunksize=EXPORT_CHUNK_SIZE,
+        )
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(buffer, index=False, header=header)
+            header = False
+        if header:
+            buffer.write(",".join(DISPLAY_COLUMNS) + "\n")
+    finally:
+        conn.close()
+    return buffer.getvalue().encode("utf-8")
+
+
+def select_date_range(db_path: Path, change_token: tuple):
+    """Sidebar date range selection; returns (start_date, end_date) or (None, None) for all rows."""
+    bounds = load_date_bounds(db_path, change_token)
+    if bounds is None:
         st.warning("No valid creation_date values found. Showing all rows.")
-        return df
+        return None, None
 
-    min_date = valid_dates.min().date()
-    max_date = valid_dates.max().date()
+    min_date, max_date = bounds
     quick_range = st.sidebar.selectbox(
         "Quick range",
         [
@@ -117,20 +373,17 @@ def apply_date_filter(df: pd.DataFrame) -> pd.DataFrame:
 
     if start_date > end_date:
         st.error("Start date cannot be after end date.")
-        return df.iloc[0:0]
+        st.stop()
 
     st.sidebar.caption(f"Active range: {start_date} to {end_date}")
-    mask = df["creation_date"].dt.date.between(start_date, end_date)
-    return df[mask]
+    return start_date, end_date
 
 
-def render_kpis(filtered_df: pd.DataFrame) -> None:
-    total_transactions = len(filtered_df)
-    full_match_count = int(filtered_df["is_fully_matched"].sum())
+def render_kpis(kpis: dict) -> None:
+    total_transactions = kpis["total_transactions"]
+    full_match_count = int(kpis["full_match_count"])
     overall_match_rate = (full_match_count / total_transactions * 100) if total_transactions else 0.0
-    avg_matched_fields = (
-        filtered_df["matched_field_count"].mean() if total_transactions else 0.0
-    )
+    avg_matched_fields = kpis["avg_matched_fields"] if total_transactions else 0.0
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Transactions", f"{total_transactions}")
@@ -139,50 +392,60 @@ def render_kpis(filtered_df: pd.DataFrame) -> None:
     c4.metric("Avg Matched Fields", f"{avg_matched_fields:.2f} / {len(VALIDATION_COLUMNS)}")
 
 
-def render_match_analysis(filtered_df: pd.DataFrame) -> None:
-    if filtered_df.empty:
+def render_match_analysis(field_counts: pd.DataFrame, distribution: pd.DataFrame) -> None:
+    if distribution.empty:
         st.info("No records found for the selected date range.")
         return
 
     st.subheader("Field-Level Match Rate")
     field_rates = (
-        (filtered_df[VALIDATION_COLUMNS] == "matched").mean().mul(100).round(2).sort_values(ascending=False)
+        (field_counts["matched"] / field_counts["total"]).mul(100).round(2)
     )
-    field_rates.index = field_rates.index.str.replace("_validation", "", regex=False)
-    for field_name, rate in field_rates.items():
+    field_rates.index = field_counts["field"]
+    for field_name, rate in field_rates.sort_values(ascending=False).items():
         st.write(f"{field_name}: {rate:.2f}%")
         st.progress(min(max(int(round(rate)), 0), 100))
 
     st.subheader("Transaction Match Distribution")
-    distribution = (
-        filtered_df["matched_field_count"]
-        .value_counts()
-        .sort_index()
-        .rename_axis("matched_fields")
-        .to_frame("transactions")
-    )
-    distribution_display = distribution.reset_index()
-    st.markdown(distribution_display.to_html(index=False), unsafe_allow_html=True)
+    st.markdown(distribution.to_html(index=False), unsafe_allow_html=True)
 
     st.subheader("Mismatch Hotspots")
-    mismatch_counts = (filtered_df[VALIDATION_COLUMNS] == "unmatched").sum().sort_values(ascending=False)
-    mismatch_counts.index = mismatch_counts.index.str.replace("_validation", "", regex=False)
-    mismatch_display = mismatch_counts.rename("unmatched_count").reset_index()
-    mismatch_display.columns = ["field", "unmatched_count"]
+    mismatch_display = (
+        field_counts[["field", "unmatched"]]
+        .rename(columns={"unmatched": "unmatched_count"})
+        .sort_values("unmatched_count", ascending=False, kind="stable")
+    )
     st.markdown(mismatch_display.to_html(index=False), unsafe_allow_html=True)
 
 
-def render_transaction_details(filtered_df: pd.DataFrame) -> None:
+def render_transaction_details(db_path: Path, change_token: tuple, start_date, end_date) -> None:
     st.subheader("Transaction Details")
-    if filtered_df.empty:
+    c1, c2 = st.columns([3, 1])
+    search = c1.text_input("Search by ID or ISIN", value="")
+    page_size = c2.selectbox(
+        "Rows per page", PAGE_SIZE_OPTIONS, index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE)
+    )
+
+    total_transactions = load_transaction_count(db_path, change_token, start_date, end_date, search)
+    if not total_transactions:
         st.info("No transactions to display.")
         return
 
-    display_df = filtered_df.copy()
-    display_df["creation_date"] = display_df["creation_date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    page_count = (total_transactions - 1) // page_size + 1
+    page = int(st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1))
+    st.caption(f"Page {page} of {page_count} ({total_transactions} transactions)")
+    page_df = load_transaction_page(
+        db_path,
+        change_token,
+        start_date,
+        end_date,
+        search,
+        page_size,
+        (page - 1) * page_size,
+    )
 
     transaction_options = [
-        f"ID {row.id} | {row.creation_date}" for row in display_df[["id", "creation_date"]].itertuples(index=False)
+        f"ID {row.id} | {row.creation_date}" for row in page_df[["id", "creation_date"]].itertuples(index=False)
     ]
     selected_option = st.selectbox("Select transaction", transaction_options)
     if selected_option is None:
@@ -190,7 +453,7 @@ def render_transaction_details(filtered_df: pd.DataFrame) -> None:
         return
     selected_id = int(selected_option.split("|")[0].replace("ID", "").strip())
 
-    selected_row = display_df.loc[display_df["id"] == selected_id, DISPLAY_COLUMNS].head(1)
+    selected_row = page_df.loc[page_df["id"] == selected_id, DISPLAY_COLUMNS].head(1)
     details_df = pd.DataFrame(
         {
             "field": selected_row.columns,
@@ -200,18 +463,24 @@ def render_transaction_details(filtered_df: pd.DataFrame) -> None:
     st.markdown(details_df.to_html(index=False), unsafe_allow_html=True)
 
     st.subheader("Filtered Transactions")
-    filtered_display = display_df[DISPLAY_COLUMNS].copy()
-    for col in filtered_display.columns:
-        filtered_display[col] = filtered_display[col].map(lambda x: "" if pd.isna(x) else str(x))
-    st.markdown(filtered_display.to_html(index=False), unsafe_allow_html=True)
-
-    csv_data = display_df[DISPLAY_COLUMNS].to_csv(index=False).encode("utf-8")
-    st.download_button(
-        label="Download filtered results (CSV)",
-        data=csv_data,
-        file_name="transaction_match_results.csv",
-        mime="text/csv",
-    )
+    # st.dataframe renders a scrollable grid that only draws the visible rows.
+    filtered_display = page_df[DISPLAY_COLUMNS].astype(object).where(page_df.notna(), "").astype(str)
+    st.dataframe(filtered_display, height=TABLE_HEIGHT, use_container_width=True)
+
+    # One export is kept per session; it is dropped once the data or filters change.
+    export_filter = (change_token, start_date, end_date, search)
+    if st.session_state.get("csv_export_filter") != export_filter:
+        st.session_state.pop("csv_export", None)
+    if st.button("Prepare CSV export"):
+        st.session_state["csv_export"] = export_transactions_csv(db_path, start_date, end_date, search)
+        st.session_state["csv_export_filter"] = export_filter
+    if "csv_export" in st.session_state:
+        st.download_button(
+            label="Download filtered results (CSV)",
+            data=st.session_state["csv_export"],
+            file_name="transaction_match_results.csv",
+            mime="text/csv",
+        )
 
 
 def main() -> None:
@@ -229,18 +498,21 @@ def main() -> None:
         st.error(f"Database not found: {DB_PATH}")
         return
 
-    raw_df = load_data(DB_PATH)
-    if raw_df.empty:
+    # Read once per rerun; cached results are reused until the database changes.
+    change_token = db_change_token(DB_PATH)
+    st.sidebar.header("Filters")
+    start_date, end_date = select_date_range(DB_PATH, change_token)
+    kpis = load_kpis(DB_PATH, change_token, start_date, end_date)
+    if start_date is None and not kpis["total_transactions"]:
         st.warning("No transaction data found.")
         return
 
-    df = add_derived_columns(raw_df)
-    st.sidebar.header("Filters")
-    filtered_df = apply_date_filter(df)
-
-    render_kpis(filtered_df)
-    render_match_analysis(filtered_df)
-    render_transaction_details(filtered_df)
+    render_kpis(kpis)
+    render_match_analysis(
+        load_field_counts(DB_PATH, change_token, start_date, end_date),
+        load_match_distribution(DB_PATH, change_token, start_date, end_date),
+    )
+    render_transaction_details(DB_PATH, change_token, start_date, end_date)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+import csv
+import random
+import string
+from datetime import date, timedelta
+from pathlib import Path
+
+from rule_extractors import is_valid_isin
+from wss_loader import VALID_COLUMNS
+
+BENCHMARK_DATA_DIR = Path("benchmark_data")
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+WSS_FILE_NAME = "WSS_Data.csv"
+TEXT_DIR_NAME = "External_Data"
+CURRENCIES = ("USD", "EUR", "GBP", "CHF", "JPY")
+FIRST_CREATION_DATE = date(2023, 1, 1)
+CREATION_DAYS = 1_000
+# Share of confirmations that disagree with their WSS row on one field.
+MISMATCH_RATE = 0.05
+PROGRESS_EVERY_ROWS = 100_000
+
+
+def _isin(rng: random.Random) -> str:
+    """Random ISIN with a valid check digit."""
+    body = rng.choice(("US", "GB", "DE", "FR")) + "".join(
+        rng.choice(string.ascii_uppercase + string.digits) for _ in range(9)
+    )
+    for digit in string.digits:
+        if is_valid_isin(body + digit):
+            return body + digit
+    raise AssertionError(f"no check digit for {body}")
+
+
+def _trade(rng: random.Random) -> dict:
+    creation_date = FIRST_CREATION_DATE + timedelta(days=rng.randrange(CREATION_DAYS))
+    return {
+        "creation_date": creation_date.isoformat(),
+        "currency": rng.choice(CURRENCIES),
+        "settlement_amount": round(rng.uniform(100_000, 50_000_000), 2),
+        "buy_sell": rng.choice(("buy", "sell")),
+        "isin": _isin(rng),
+        "settlement_date": (creation_date + timedelta(days=2)).isoformat(),
+        "SSI": f"PSET {''.join(rng.choice(string.ascii_uppercase) for _ in range(4))}GB2L",
+    }
+
+
+def _document_trade(trade: dict, rng: random.Random) -> dict:
+    """Values printed on the confirmation; occasionally one field differs from the WSS row."""
+    document = dict(trade)
+    if rng.random() < MISMATCH_RATE:
+        field = rng.choice(("currency", "settlement_amount", "isin", "settlement_date", "SSI"))
+        if field == "currency":
+            document[field] = rng.choice([code for code in CURRENCIES if code != trade[field]])
+        elif field == "settlement_amount":
+            document[field] = round(trade[field] + rng.uniform(1, 1_000), 2)
+        elif field == "isin":
+            document[field] = _isin(rng)
+        elif field == "settlement_date":
+            document[field] = (date.fromisoformat(trade[field]) + timedelta(days=1)).isoformat()
+        else:
+            document[field] = f"{trade[field]} / REF {rng.randrange(10_000)}"
+    return document
+
+
+def render_confirmation(trade: dict, row_id: int) -> str:
+    """Confirmation text laid out like the exported PDFs: labels followed by their values."""
+    settlement_date = date.fromisoformat(trade["settlement_date"])
+    side = "sold" if trade["buy_sell"] == "buy" else "bought"
+    return "\n".join(
+        [
+            "Synthetic Securities Branch",
+            "1 Example Street",
+            "London",
+            "Client Name:",
+            "SYNTHETIC CLIENT",
+            "Confirmation Ref:",
+            f"{row_id}/1",
+            f"We have {side} on Principal terms",
+            "Trade Date:",
+            (settlement_date - timedelta(days=2)).strftime("%d %B %Y"),
+            "Settlement Date:",
+            settlement_date.strftime("%d %B %Y"),
+            "ISIN:",
+            trade["isin"],
+            "Quantity:",
+            "1,000,000",
+            "Net Consideration:",
+            f"{trade['currency']} {trade['settlement_amount']:,.2f}",
+            "Delivery Versus Payment",
+            trade["SSI"],
+            "This is conclusive and binding unless disputed by you within 24 hours of receipt.",
+        ]
+    ) + "\n"
+
+
+def generate_corpus(
+    output_dir: Path,
+    rows: int,
+    seed: int = 0,
+) -> tuple[Path, Path]:
+    """Write ``rows`` synthetic confirmations and the matching WSS source file.
+
+    Produces ``output_dir/External_Data/TX{id:06d}.txt`` for ids 1..rows and
+    ``output_dir/WSS_Data.csv`` with one row per confirmation, in id order,
+    so loading the CSV into an empty database with wss_loader creates the
+    matching ``confirmation_data`` rows. Output is deterministic for a seed.
+    Returns (wss_file, text_dir).
+    """
+    rng = random.Random(seed)
+    text_dir = output_dir / TEXT_DIR_NAME
+    text_dir.mkdir(parents=True, exist_ok=True)
+    wss_file = output_dir / WSS_FILE_NAME
+
+    with open(wss_file, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=VALID_COLUMNS)
+        writer.writeheader()
+        for row_id in range(1, rows + 1):
+            trade = _trade(rng)
+            writer.writerow(trade)
+            text = render_confirmation(_document_trade(trade, rng), row_id)
+            (text_dir / f"TX{row_id:06d}.txt").write_text(text, encoding="utf-8")
+            if row_id % PROGRESS_EVERY_ROWS == 0:
+                print(f"Generated {row_id} of {rows} confirmation(s)")
+
+    print(f"Synthetic corpus of {rows} confirmation(s) written to {output_dir}")
+    return wss_file, text_dir
+
+
+if __name__ == "__main__":
+    for scale in ("1k",):
+        generate_corpus(BENCHMARK_DATA_DIR / scale, SCALES[scale])
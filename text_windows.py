@@ -0,0 +1,46 @@
+import re
+
+WINDOW_LINES_BEFORE = 2
+WINDOW_LINES_AFTER = 8
+WINDOW_SEPARATOR = "\n...\n"
+# Rough characters-per-token ratio for llama-family tokenizers on English text.
+CHARS_PER_TOKEN = 4
+
+
+def relevant_window(
+    text: str,
+    anchors: tuple[str, ...],
+    lines_before: int = WINDOW_LINES_BEFORE,
+    lines_after: int = WINDOW_LINES_AFTER,
+) -> str:
+    """Keep only the lines around anchor labels; return the full text when no anchor is found.
+
+    Anchors match at the start of a word, so "SSI" matches "SSIs" but not
+    "commission". Overlapping windows are merged and kept in document order.
+    """
+    if not anchors:
+        return text
+
+    pattern = re.compile(
+        r"(?<![A-Za-z0-9])(?:" + "|".join(re.escape(anchor) for anchor in anchors) + ")",
+        re.IGNORECASE,
+    )
+    lines = text.splitlines()
+    spans: list[list[int]] = []
+    for idx, line in enumerate(lines):
+        if not pattern.search(line):
+            continue
+        start = max(idx - lines_before, 0)
+        end = min(idx + lines_after + 1, len(lines))
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+
+    if not spans:
+        return text
+    return WINDOW_SEPARATOR.join("\n".join(lines[start:end]) for start, end in spans)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
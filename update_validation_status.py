@@ -1,18 +1,41 @@
+import re
 import sqlite3
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
 
+from create_confirmation_table import ensure_confirmation_schema
+from match_stats import DAY_SQL, STALE_DAYS_TABLE, refresh_daily_match_stats
+from rule_extractors import parse_date
+
 
 DB_PATH = Path("DB") / "confirmation.db"
 TABLE_NAME = "confirmation_data"
+FIELD_PAIRS = [
+    ("currency", "currency_LLM", "currency_validation"),
+    ("settlement_amount", "settlement_amount_LLM", "settlement_amount_validation"),
+    ("buy_sell", "buy_sell_LLM", "buy_sell_validation"),
+    ("isin", "isin_LLM", "isin_validation"),
+    ("settlement_date", "settlement_date_LLM", "settlement_date_validation"),
+    ("SSI", "SSI_LLM", "SSI_validation"),
+]
+BUY_TOKENS = ("buy", "b", "purchase", "long")
+SELL_TOKENS = ("sell", "s", "short", "dispose")
+# Absolute difference still treated as a settlement_amount match.
+SETTLEMENT_AMOUNT_TOLERANCE = Decimal("0.01")
+# SQLite's default limit on host parameters is 999 on older builds.
+ID_BATCH_SIZE = 500
+
+
+_WHITESPACE = re.compile(r"\s+")
+_AMOUNT_SEPARATORS = re.compile(r"[,\s]")
 
 
 def _normalize(value):
     """Normalize values for stable comparisons across TEXT/REAL columns."""
     if value is None:
         return None
-    if isinstance(value, (int, float)):
-        return str(value).strip()
-    return str(value).strip()
+    return str(value).strip() or None
 
 
 def _normalize_buy_sell(value):
@@ -24,63 +47,201 @@ def _normalize_buy_sell(value):
     if not token:
         return None
 
-    buy_tokens = {"buy", "b", "purchase", "long"}
-    sell_tokens = {"sell", "s", "short", "dispose"}
-
-    if token in buy_tokens:
+    if token in BUY_TOKENS:
         return "buy"
-    if token in sell_tokens:
+    if token in SELL_TOKENS:
         return "sell"
     return token
 
 
-def update_validation_statuses(db_path: Path = DB_PATH) -> None:
-    pairs = [
-        ("currency", "currency_LLM", "currency_validation"),
-        ("settlement_amount", "settlement_amount_LLM", "settlement_amount_validation"),
-        ("buy_sell", "buy_sell_LLM", "buy_sell_validation"),
-        ("isin", "isin_LLM", "isin_validation"),
-        ("settlement_date", "settlement_date_LLM", "settlement_date_validation"),
-        ("SSI", "SSI_LLM", "SSI_validation"),
-    ]
+def _normalize_code(value):
+    """Uppercase identifiers such as ISIN and currency codes."""
+    text = _normalize(value)
+    return text.upper() if text is not None else None
+
+
+def _normalize_ssi(value):
+    """Collapse line breaks and repeated whitespace in settlement instructions."""
+    text = _normalize(value)
+    return _WHITESPACE.sub(" ", text) if text is not None else None
+
+
+def _to_decimal(value) -> Decimal | None:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return Decimal(repr(value))
+    text = _AMOUNT_SEPARATORS.sub("", str(value))
+    if text.startswith("(") and text.endswith(")"):
+        text = f"-{text[1:-1]}"
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def _to_date(value) -> date | None:
+    text = _normalize(value)
+    if text is None:
+        return None
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        return parse_date(text)
+
+
+def _equal_comparator(normalize):
+    def compare(left, right) -> bool:
+        left, right = normalize(left), normalize(right)
+        return left is not None and right is not None and left == right
+
+    return compare
 
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
 
-    # Normalize buy_sell_LLM in table before validation comparison.
-    cur.execute(f"SELECT id, buy_sell_LLM FROM {TABLE_NAME}")
-    buy_sell_rows = cur.fetchall()
-    normalized_buy_sell_updates = [
-        (_normalize_buy_sell(llm_value), row_id) for row_id, llm_value in buy_sell_rows
-    ]
-    cur.executemany(
-        f"UPDATE {TABLE_NAME} SET buy_sell_LLM = ? WHERE id = ?",
-        normalized_buy_sell_updates,
+def _date_comparator(left, right) -> bool:
+    """Compare as dates; values that do not parse as one fall back to string equality."""
+    left_date, right_date = _to_date(left), _to_date(right)
+    if left_date is not None and right_date is not None:
+        return left_date == right_date
+    left, right = _normalize(left), _normalize(right)
+    return left is not None and right is not None and left == right
+
+
+def _amount_comparator(tolerance: Decimal):
+    def compare(left, right) -> bool:
+        left, right = _to_decimal(left), _to_decimal(right)
+        return left is not None and right is not None and abs(left - right) <= tolerance
+
+    return compare
+
+
+def build_comparators(amount_tolerance: Decimal = SETTLEMENT_AMOUNT_TOLERANCE) -> dict:
+    """Typed match functions per source column."""
+    return {
+        "currency": _equal_comparator(_normalize_code),
+        "settlement_amount": _amount_comparator(amount_tolerance),
+        "buy_sell": _equal_comparator(_normalize_buy_sell),
+        "isin": _equal_comparator(_normalize_code),
+        "settlement_date": _date_comparator,
+        "SSI": _equal_comparator(_normalize_ssi),
+    }
+
+
+def _comparator_function_name(source_col: str) -> str:
+    return f"validation_status_{source_col.lower()}"
+
+
+def register_validation_functions(
+    conn: sqlite3.Connection,
+    amount_tolerance: Decimal = SETTLEMENT_AMOUNT_TOLERANCE,
+) -> None:
+    """Expose the typed comparators to SQL so validation runs inside UPDATE statements."""
+    for source_col, compare in build_comparators(amount_tolerance).items():
+
+        def status(left, right, compare=compare) -> str:
+            return "matched" if compare(left, right) else "unmatched"
+
+        conn.create_function(
+            _comparator_function_name(source_col), 2, status, deterministic=True
+        )
+    conn.create_function("normalize_buy_sell", 1, _normalize_buy_sell, deterministic=True)
+
+
+def _id_batches(row_ids):
+    if row_ids is None:
+        yield None
+        return
+    row_ids = list(row_ids)
+    for start in range(0, len(row_ids), ID_BATCH_SIZE):
+        yield row_ids[start:start + ID_BATCH_SIZE]
+
+
+def validate_rows(
+    conn: sqlite3.Connection,
+    row_ids=None,
+    amount_tolerance: Decimal = SETTLEMENT_AMOUNT_TOLERANCE,
+    refresh_stats: bool = True,
+) -> int:
+    """Recompute *_validation for rows queued by validation_pending.
+
+    Comparison runs inside SQLite UPDATE statements through the typed
+    comparators of register_validation_functions; rows whose source and
+    *_LLM values have not changed since the last pass are not touched. Pass
+    ``row_ids`` to limit the pass to specific rows. The daily match summaries
+    of the days those rows belong to, and of days rows have moved away from,
+    are recomputed unless ``refresh_stats`` is False. The caller commits.
+    """
+    register_validation_functions(conn, amount_tolerance)
+    cur = conn.cursor()
+    normalized_buy_sell = "normalize_buy_sell(buy_sell_LLM)"
+    assignments = ",\n".join(
+        f"{validation_col} = {_comparator_function_name(source_col)}({source_col}, {llm_col})"
+        for source_col, llm_col, validation_col in FIELD_PAIRS
     )
 
-    for source_col, llm_col, validation_col in pairs:
-        cur.execute(f"SELECT id, {source_col}, {llm_col} FROM {TABLE_NAME}")
-        rows = cur.fetchall()
-
-        updates = []
-        for row_id, source_value, llm_value in rows:
-            if source_col == "buy_sell":
-                left = _normalize_buy_sell(source_value)
-                right = _normalize_buy_sell(llm_value)
-            else:
-                left = _normalize(source_value)
-                right = _normalize(llm_value)
-            status = "matched" if (left is not None and right is not None and left == right) else "unmatched"
-            updates.append((status, row_id))
-
-        cur.executemany(
-            f"UPDATE {TABLE_NAME} SET {validation_col} = ? WHERE id = ?",
-            updates,
+    validated = 0
+    days: set[str] = set()
+    for batch in _id_batches(row_ids):
+        where = "validation_pending = 1"
+        params: list = []
+        if batch is not None:
+            if not batch:
+                continue
+            where += f" AND id IN ({', '.join('?' for _ in batch)})"
+            params = batch
+
+        if refresh_stats:
+            days.update(
+                day
+                for (day,) in cur.execute(
+                    f"SELECT DISTINCT {DAY_SQL} FROM {TABLE_NAME} WHERE {where}", params
+                )
+            )
+        # Normalize buy_sell_LLM in table before validation comparison.
+        cur.execute(
+            f"""
+            UPDATE {TABLE_NAME}
+            SET buy_sell_LLM = {normalized_buy_sell}
+            WHERE {where} AND buy_sell_LLM IS NOT ({normalized_buy_sell})
+            """,
+            params,
         )
+        cur.execute(
+            f"""
+            UPDATE {TABLE_NAME}
+            SET {assignments},
+                validation_pending = 0
+            WHERE {where}
+            """,
+            params,
+        )
+        validated += cur.rowcount
+    if refresh_stats:
+        # Days rows have moved away from since their summaries were computed.
+        days.update(day for (day,) in cur.execute(f"SELECT day FROM {STALE_DAYS_TABLE}"))
+    if days:
+        refresh_daily_match_stats(conn, days)
+    return validated
+
 
-    conn.commit()
-    conn.close()
-    print(f"Validation columns updated in {db_path}")
+def update_validation_statuses(db_path: Path = DB_PATH, full: bool = False) -> None:
+    """Validate rows changed since the last pass, or every row when ``full`` is set.
+
+    A full pass also rebuilds the daily match summaries from scratch.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_confirmation_schema(conn)
+        if full:
+            conn.execute(f"UPDATE {TABLE_NAME} SET validation_pending = 1")
+        validated = validate_rows(conn, refresh_stats=not full)
+        if full:
+            refresh_daily_match_stats(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Validation columns updated for {validated} row(s) in {db_path}")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
+import hashlib
+import json
+import numbers
 import sqlite3
+from collections import Counter
+from collections.abc import Iterator
 from pathlib import Path
 
 import pandas as pd
 
+from create_confirmation_table import ensure_confirmation_schema
+
 DEFAULT_WSS_FILE = Path("utility") / "WSS_Data.xlsx"
 DEFAULT_DB_PATH = Path("DB") / "confirmation.db"
 TARGET_TABLE = "confirmation_data"
@@ -18,6 +25,19 @@ VALID_COLUMNS = [
 COLUMN_ALIASES = {
     "create_date": "creation_date",
 }
+# Columns whose values identify a trade across reloads. Amount and SSI are left
+# out so a corrected amount or SSI updates the trade in place; a change to any
+# key column inserts the row as a new trade.
+NATURAL_KEY_COLUMNS = ["creation_date", "currency", "buy_sell", "isin", "settlement_date"]
+# Bumped when _canonical or the key layout changes, so existing rows are
+# re-keyed on the next load.
+SOURCE_KEY_VERSION = 3
+# Rows read and written per chunk.
+READ_CHUNK_SIZE = 10_000
+# WSS Excel exports: row 1 is the header, data import starts from row 7.
+EXCEL_SKIP_ROWS = 5
+# SQLite's default limit on host parameters is 999 on older builds.
+KEY_LOOKUP_BATCH_SIZE = 500
 
 
 def _normalize_date_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -30,44 +50,287 @@ def _normalize_date_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _source_column(name) -> str:
+    name = str(name).strip()
+    return COLUMN_ALIASES.get(name, name)
+
+
+def _excel_chunks(wss_file: Path, chunk_size: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(wss_file, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [_source_column(col) for col in next(rows, ())]
+    keep = [(idx, col) for idx, col in enumerate(header) if col in VALID_COLUMNS]
+    columns = [col for _, col in keep]
+
+    def chunks():
+        try:
+            for _ in range(EXCEL_SKIP_ROWS):
+                next(rows, None)
+            buffer = []
+            for row in rows:
+                values = [row[idx] if idx < len(row) else None for idx, _ in keep]
+                if all(value is None for value in values):
+                    continue
+                buffer.append(values)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+    return header, chunks()
+
+
+def _csv_chunks(wss_file: Path, chunk_size: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    header = [_source_column(col) for col in pd.read_csv(wss_file, nrows=0).columns]
+    reader = pd.read_csv(
+        wss_file,
+        usecols=lambda col: _source_column(col) in VALID_COLUMNS,
+        chunksize=chunk_size,
+    )
+    return header, (chunk.rename(columns=_source_column) for chunk in reader)
+
+
+def _parquet_chunks(wss_file: Path, chunk_size: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Parquet input requires pyarrow: pip install pyarrow") from exc
+
+    parquet_file = pq.ParquetFile(wss_file)
+    names = parquet_file.schema_arrow.names
+    needed = [name for name in names if _source_column(name) in VALID_COLUMNS]
+    batches = parquet_file.iter_batches(batch_size=chunk_size, columns=needed)
+    header = [_source_column(name) for name in names]
+    return header, (batch.to_pandas().rename(columns=_source_column) for batch in batches)
+
+
+def _source_chunks(wss_file: Path, chunk_size: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    """Return the aliased header and an iterator of DataFrames holding only VALID_COLUMNS."""
+    suffix = wss_file.suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        return _excel_chunks(wss_file, chunk_size)
+    if suffix == ".csv":
+        return _csv_chunks(wss_file, chunk_size)
+    if suffix == ".parquet":
+        return _parquet_chunks(wss_file, chunk_size)
+    raise ValueError(f"Unsupported WSS file type: {wss_file.suffix}")
+
+
+def _canonical(value):
+    """Stable representation of a cell for natural-key hashing and comparison.
+
+    Numbers are compared as floats, so 31263191 and 31263191.0 (whichever a
+    chunk's dtype inference produced) give the same key.
+    """
+    if value is None:
+        return None
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return None if pd.isna(value) else repr(float(value))
+    return str(value).strip()
+
+
+def _key_prefix(key_columns: list[str]) -> str:
+    """Tag keys with the key definition so changing it re-keys old rows.
+
+    The definition covers NATURAL_KEY_COLUMNS and SOURCE_KEY_VERSION.
+    """
+    definition = json.dumps([SOURCE_KEY_VERSION, key_columns])
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()[:8] + ":"
+
+
+def _source_key(record: dict, key_columns: list[str], occurrences: Counter) -> str:
+    """Key of ``record``; the n-th row with the same key values gets occurrence n.
+
+    Identical source rows (e.g. split fills) therefore keep one database row
+    each, matched to existing rows in id order.
+    """
+    values = json.dumps([_canonical(record.get(col)) for col in key_columns])
+    digest = hashlib.sha256(values.encode("utf-8")).digest()
+    occurrence = occurrences[digest]
+    occurrences[digest] += 1
+    payload = json.dumps([values, occurrence])
+    return _key_prefix(key_columns) + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _backfill_source_keys(conn: sqlite3.Connection, key_columns: list[str]) -> None:
+    """Re-key every row, in id order, when any row is unkeyed or keyed under another definition.
+
+    Occurrence numbers depend on the rows before each one, so all rows are keyed together.
+    """
+    prefix = _key_prefix(key_columns)
+    cursor = conn.cursor()
+    stale = cursor.execute(
+        f"SELECT 1 FROM {TARGET_TABLE} "
+        "WHERE source_key IS NULL OR substr(source_key, 1, ?) != ? LIMIT 1",
+        (len(prefix), prefix),
+    ).fetchone()
+    if stale is None:
+        return
+
+    occurrences: Counter = Counter()
+    updates = [
+        (_source_key(dict(zip(key_columns, values)), key_columns, occurrences), row_id)
+        for row_id, *values in cursor.execute(
+            f"SELECT id, {', '.join(key_columns)} FROM {TARGET_TABLE} ORDER BY id"
+        ).fetchall()
+    ]
+    # Clear first so the unique index never sees an old key and a new one collide.
+    cursor.execute(f"UPDATE {TARGET_TABLE} SET source_key = NULL")
+    cursor.executemany(f"UPDATE {TARGET_TABLE} SET source_key = ? WHERE id = ?", updates)
+
+
+def _existing_rows(conn: sqlite3.Connection, keys: list[str], columns: list[str]) -> dict:
+    existing = {}
+    for start in range(0, len(keys), KEY_LOOKUP_BATCH_SIZE):
+        batch = keys[start:start + KEY_LOOKUP_BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT source_key, id, {', '.join(columns)} FROM {TARGET_TABLE} "
+            f"WHERE source_key IN ({', '.join('?' for _ in batch)})",
+            batch,
+        )
+        for key, row_id, *values in rows:
+            existing[key] = (row_id, values)
+    return existing
+
+
+def _insert_frame(conn: sqlite3.Connection, df: pd.DataFrame, columns: list[str]) -> int:
+    """Append every row on ``conn`` without committing (DataFrame.to_sql commits per chunk)."""
+    conn.executemany(
+        f"INSERT INTO {TARGET_TABLE} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})",
+        [[record.get(col) for col in columns] for record in _records(df)],
+    )
+    return len(df)
+
+
+def _upsert_frame(
+    conn: sqlite3.Connection,
+    df: pd.DataFrame,
+    columns: list[str],
+    key_columns: list[str],
+    occurrences: Counter,
+) -> Counter:
+    """Insert rows with unseen natural keys and update rows whose values changed.
+
+    ``occurrences`` carries the per-key row counts across the chunks of one load.
+    """
+    counts: Counter = Counter()
+    by_key = {_source_key(record, key_columns, occurrences): record for record in _records(df)}
+
+    existing = _existing_rows(conn, list(by_key), columns)
+    inserts = []
+    updates = []
+    for key, record in by_key.items():
+        values = [record.get(col) for col in columns]
+        if key not in existing:
+            inserts.append((*values, key))
+            continue
+        row_id, current = existing[key]
+        if [_canonical(value) for value in current] == [_canonical(value) for value in values]:
+            counts["unchanged"] += 1
+        else:
+            updates.append((*values, row_id))
+
+    conn.executemany(
+        f"INSERT INTO {TARGET_TABLE} ({', '.join(columns)}, source_key) "
+        f"VALUES ({', '.join('?' for _ in columns)}, ?)",
+        inserts,
+    )
+    conn.executemany(
+        f"UPDATE {TARGET_TABLE} SET {', '.join(f'{col} = ?' for col in columns)} WHERE id = ?",
+        updates,
+    )
+    counts["inserted"] += len(inserts)
+    counts["updated"] += len(updates)
+    return counts
+
+
 def load_wss_data_to_db(
     wss_file: Path = DEFAULT_WSS_FILE,
     db_path: Path = DEFAULT_DB_PATH,
-) -> int:
-    """Load WSS Excel rows into confirmation_data using matching table columns only."""
+    mode: str = "upsert",
+    natural_key_columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> dict:
+    """Load WSS rows (Excel, CSV or Parquet) into confirmation_data using matching table columns only.
+
+    Only VALID_COLUMNS are read, ``chunk_size`` rows at a time, and each chunk
+    is written before the next is read. ``mode="upsert"`` keys rows on
+    ``natural_key_columns`` (default NATURAL_KEY_COLUMNS) so reloading the
+    same file inserts nothing. ``mode="append"`` inserts every row. The load
+    runs in one transaction and returns inserted/updated/unchanged counts.
+    """
+    if mode not in ("upsert", "append"):
+        raise ValueError(f"Unknown load mode: {mode}")
+
     if not wss_file.exists():
-        raise FileNotFoundError(f"Excel file not found: {wss_file}")
+        raise FileNotFoundError(f"WSS file not found: {wss_file}")
 
     if not db_path.exists():
         raise FileNotFoundError(f"Database file not found: {db_path}")
 
     print(f"Reading {wss_file}...")
-    # Excel row 1 is the header; start data import from row 7.
-    df = pd.read_excel(wss_file, skiprows=range(1, 6))
-    df.columns = [str(col).strip() for col in df.columns]
-    df = df.rename(columns=COLUMN_ALIASES)
-    df = _normalize_date_columns(df)
+    header, chunks = _source_chunks(wss_file, chunk_size)
 
-    matched_columns = [col for col in VALID_COLUMNS if col in df.columns]
+    matched_columns = [col for col in VALID_COLUMNS if col in header]
     if not matched_columns:
         raise ValueError(
             "No matching columns found for confirmation_data. "
-            f"Excel columns: {list(df.columns)}"
+            f"Source columns: {header}"
         )
 
-    extra_columns = [col for col in df.columns if col not in VALID_COLUMNS]
+    extra_columns = [col for col in header if col not in VALID_COLUMNS]
     if extra_columns:
         print(f"Ignoring extra columns: {extra_columns}")
-
-    filtered_df = df[matched_columns]
     print(f"Columns used: {matched_columns}")
-    print(f"Rows to insert: {len(filtered_df)}")
 
-    with sqlite3.connect(db_path) as conn:
-        filtered_df.to_sql(TARGET_TABLE, conn, if_exists="append", index=False)
+    key_columns = [
+        col for col in (natural_key_columns or NATURAL_KEY_COLUMNS) if col in matched_columns
+    ]
+    if mode == "upsert" and not key_columns:
+        raise ValueError(f"None of the natural key columns are present: {natural_key_columns}")
+
+    counts: Counter = Counter()
+    occurrences: Counter = Counter()
+    rows_read = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            if mode == "upsert":
+                ensure_confirmation_schema(conn)
+                _backfill_source_keys(conn, key_columns)
+            for chunk in chunks:
+                chunk = _normalize_date_columns(chunk)[matched_columns]
+                rows_read += len(chunk)
+                if mode == "append":
+                    counts["inserted"] += _insert_frame(conn, chunk, matched_columns)
+                else:
+                    counts.update(
+                        _upsert_frame(conn, chunk, matched_columns, key_columns, occurrences)
+                    )
+    finally:
+        conn.close()
 
-    print(f"Inserted {len(filtered_df)} row(s) into {TARGET_TABLE}.")
-    return len(filtered_df)
+    summary = {
+        "inserted": counts["inserted"],
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+    }
+    print(f"Rows read: {rows_read}")
+    print(
+        f"{TARGET_TABLE}: {summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['unchanged']} unchanged"
+    )
+    return summary
 
 
 if __name__ == "__main__":